@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+ann.py - Approximate nearest-neighbour search over unit-normalized vectors
+Inverted-file (IVF) index with a spherical k-means coarse quantizer, plus an
+exact brute-force index exposing the same interface for validation.
+Either index can score queries against int8 codes of the vectors
+(utils/quantize.py) and re-rank the best candidates against the float32 ones.
+kNN graphs are built in row blocks on a thread pool, with each block's
+score matrix bounded by KNN_BLOCK_BYTES.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from utils.topk import top_k_with_scores
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+BLOCK_ROWS = 4096
+
+# Bytes of float32 scores one kNN-graph block may hold; peak scoring memory
+# is roughly workers * KNN_BLOCK_BYTES
+KNN_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _top_k(scores, k):
+    return top_k_with_scores(np.atleast_2d(scores), k)
+
+
+def _block_rows(n_columns, budget=KNN_BLOCK_BYTES):
+    """Rows per block so that a float32 score block stays within `budget` bytes"""
+    return int(max(1, min(BLOCK_ROWS, budget // (4 * max(n_columns, 1)))))
+
+
+def run_blocks(fn, blocks, workers=None, progress=None):
+    """Call fn(block) for every block on a pool of `workers` threads.
+
+    NumPy releases the GIL in matrix multiplies and partitions, so blocks run in
+    parallel without copying the vectors into other processes. `progress`, if
+    given, is called as progress(done, total) after each block.
+    """
+    blocks = list(blocks)
+    workers = max(1, workers or os.cpu_count() or 1)
+    if workers == 1:
+        for done, block in enumerate(blocks, 1):
+            fn(block)
+            if progress:
+                progress(done, len(blocks))
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, block) for block in blocks]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if progress:
+                progress(done, len(blocks))
+
+
+def _as_queries(queries):
+    return np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+
+def _exact_search(vectors, queries, k, candidates=None, quantized=None):
+    """(ids, scores) of the k best of `candidates` (default: all rows) for each
+    query, padded with -1 / -inf when there are fewer than k candidates.
+
+    With `quantized` codes of the vectors, candidates are scored from the codes
+    and the best are re-ranked against `vectors`.
+    """
+    ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+    scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+    if quantized is not None:
+        top, top_scores = quantized.search(queries, k, rows=candidates, vectors=vectors)
+        found = top.shape[1]
+        ids[:, :found] = top
+        scores[:, :found] = top_scores
+        return ids, scores
+    pool = vectors if candidates is None else vectors[candidates]
+    top, top_scores = _top_k(queries @ pool.T, k)
+    found = top.shape[1]
+    ids[:, :found] = top if candidates is None else candidates[top]
+    scores[:, :found] = top_scores
+    return ids, scores
+
+
+class BruteForceIndex:
+    """Exact inner-product search; the reference the IVF index is validated against"""
+
+    kind = "brute"
+
+    def __init__(self, vectors, quantized=None):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.quantized = quantized
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def search(self, queries, k, mask=None, **_):
+        """Return (ids, scores) of the k best matches for each query row.
+
+        With a boolean `mask`, only jobs where it is set are scored and
+        missing results are padded with -1.
+        """
+        queries = _as_queries(queries)
+        if mask is None:
+            if self.quantized is not None:
+                return self.quantized.search(queries, k, vectors=self.vectors)
+            return _top_k(queries @ self.vectors.T, k)
+        return _exact_search(self.vectors, queries, k, np.flatnonzero(mask), self.quantized)
+
+    def knn_graph(self, k, workers=None, progress=None, **_):
+        """k nearest neighbours of every indexed vector, excluding itself"""
+        n = len(self)
+        k = min(k, n - 1)
+        ids = np.empty((n, max(k, 0)), dtype=np.int32)
+        scores = np.empty((n, max(k, 0)), dtype=np.float32)
+        rows = _block_rows(n)
+
+        def score_block(start):
+            stop = min(start + rows, n)
+            block = self.vectors[start:stop] @ self.vectors.T
+            block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            ids[start:stop], scores[start:stop] = _top_k(block, k)
+
+        run_blocks(score_block, range(0, n, rows), workers, progress)
+        return ids, scores
+
+    def add(self, vectors):
+        """Index with `vectors` appended; their ids continue from len(self)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        quantized = None if self.quantized is None else self.quantized.add(vectors)
+        return BruteForceIndex(np.vstack([self.vectors, vectors]), quantized)
+
+    def save(self, path):
+        """Nothing to persist: the vectors themselves are the index"""
+
+    def stats(self):
+        stats = {"kind": self.kind, "size": len(self)}
+        if self.quantized is not None:
+            stats["quantized"] = self.quantized.stats()
+        return stats
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are bucketed by nearest centroid and a query
+    only scores the `nprobe` buckets whose centroids it is closest to.
+
+    `nprobe` is the recall-vs-latency knob; nprobe >= n_lists is exact search.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, list_offsets, list_ids, nprobe=DEFAULT_NPROBE, quantized=None):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int32)
+        self.nprobe = nprobe
+        self.quantized = quantized
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, nprobe=DEFAULT_NPROBE, seed=42):
+        """Train a spherical k-means quantizer and bucket every vector"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, n_lists * KMEANS_SAMPLE_PER_LIST)
+        sample = vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Reseed empty buckets from random sample points
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        assign = cls._assign(vectors, centroids)
+        list_ids = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=n_lists), out=list_offsets[1:])
+        return cls(vectors, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        assign = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS] @ centroids.T
+            assign[start:start + BLOCK_ROWS] = block.argmax(axis=1)
+        return assign
+
+    def _candidates(self, lists):
+        return np.concatenate([
+            self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists
+        ])
+
+    def search(self, queries, k, nprobe=None, mask=None):
+        """Return (ids, scores) of the approximate k best matches for each query row.
+
+        With a boolean `mask`, probed candidates outside it are dropped; when
+        the probed buckets hold fewer than k masked jobs, the query falls back
+        to exact search over the mask so selective filters still fill k slots.
+        """
+        queries = _as_queries(queries)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        probes, _ = _top_k(queries @ self.centroids.T, nprobe)
+
+        ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        allowed = None
+        for row, query in enumerate(queries):
+            candidates = self._candidates(probes[row])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+                if len(candidates) < k:
+                    if allowed is None:
+                        allowed = np.flatnonzero(mask)
+                    ids[row], scores[row] = _exact_search(
+                        self.vectors, query[None, :], k, allowed, self.quantized
+                    )
+                    continue
+            ids[row], scores[row] = _exact_search(self.vectors, query[None, :], k, candidates, self.quantized)
+        return ids, scores
+
+    def knn_graph(self, k, nprobe=None, workers=None, progress=None):
+        """k approximate nearest neighbours of every indexed vector, excluding itself.
+
+        Members of a bucket share one candidate set: the `nprobe` buckets nearest
+        to their centroid, so each bucket is scored with one matrix multiply per
+        row block.
+        """
+        n = len(self)
+        k = min(k, n - 1)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        ids = np.full((n, max(k, 0)), -1, dtype=np.int32)
+        scores = np.full((n, max(k, 0)), -np.inf, dtype=np.float32)
+        if k <= 0:
+            return ids, scores
+
+        probes, _ = _top_k(self.centroids @ self.centroids.T, nprobe)
+        candidate_counts = np.diff(self.list_offsets)[probes].sum(axis=1)
+        blocks = []
+        for l in range(self.n_lists):
+            rows = _block_rows(candidate_counts[l])
+            for start in range(self.list_offsets[l], self.list_offsets[l + 1], rows):
+                blocks.append((l, start, min(start + rows, int(self.list_offsets[l + 1]))))
+
+        def score_block(task):
+            l, start, stop = task
+            members = self.list_ids[start:stop]
+            candidates = self._candidates(probes[l])
+            block = self.vectors[members] @ self.vectors[candidates].T
+            block[members[:, None] == candidates[None, :]] = -np.inf
+            top, top_scores = _top_k(block, k)
+            # With k or fewer candidates the excluded self entry is picked too; keep it as padding
+            hit = np.isfinite(top_scores)
+            found = top.shape[1]
+            ids[members, :found] = np.where(hit, candidates[top], -1)
+            scores[members, :found] = np.where(hit, top_scores, -np.inf)
+
+        run_blocks(score_block, blocks, workers, progress)
+        return ids, scores
+
+    def add(self, vectors):
+        """Index with `vectors` appended to their nearest buckets; ids continue
+        from len(self). The quantizer is not retrained."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(self)
+        old_assign = np.repeat(np.arange(self.n_lists), np.diff(self.list_offsets))
+        assign = np.concatenate([old_assign, self._assign(vectors, self.centroids)])
+        ids = np.concatenate([self.list_ids, np.arange(n, n + vectors.shape[0], dtype=np.int32)])
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.n_lists), out=list_offsets[1:])
+        quantized = None if self.quantized is None else self.quantized.add(vectors)
+        return IVFIndex(
+            np.vstack([self.vectors, vectors]), self.centroids, list_offsets, ids[order],
+            nprobe=self.nprobe, quantized=quantized,
+        )
+
+    def save(self, path):
+        """Persist the quantizer and bucket layout (vectors are stored separately)"""
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids)
+
+    @classmethod
+    def load(cls, path, vectors, nprobe=DEFAULT_NPROBE, quantized=None):
+        with np.load(path) as arrays:
+            return cls(
+                vectors, arrays["centroids"], arrays["list_offsets"], arrays["list_ids"],
+                nprobe=nprobe, quantized=quantized,
+            )
+
+    def stats(self):
+        sizes = np.diff(self.list_offsets)
+        stats = {
+            "kind": self.kind,
+            "size": len(self),
+            "n_lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "max_list": int(sizes.max()) if sizes.size else 0,
+        }
+        if self.quantized is not None:
+            stats["quantized"] = self.quantized.stats()
+        return stats
+
+
+ENGINES = {"brute": BruteForceIndex, "ivf": IVFIndex}
+
+
+def build_index(kind, vectors, nprobe=DEFAULT_NPROBE, quantized=None):
+    """Build an index of the given engine kind ("ivf" or "brute")"""
+    if kind == "ivf":
+        index = IVFIndex.build(vectors, nprobe=nprobe)
+        index.quantized = quantized
+        return index
+    if kind == "brute":
+        return BruteForceIndex(vectors, quantized)
+    raise ValueError(f"Unknown ANN engine: {kind!r} (expected one of {sorted(ENGINES)})")
+
+
+def recall_at_k(index, reference, queries, k):
+    """Fraction of the reference top-k ids that `index` also returns"""
+    approx_ids, _ = index.search(queries, k)
+    exact_ids, _ = reference.search(queries, k)
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx_ids.tolist(), exact_ids.tolist()))
+    return hits / max(exact_ids.size, 1)
+
+
+def graph_recall(vectors, neighbor_ids, rows):
+    """Fraction of the exact nearest neighbours of `rows` (excluding themselves)
+    that the kNN graph `neighbor_ids` lists for them"""
+    rows = np.asarray(rows)
+    k = neighbor_ids.shape[1]
+    if not len(rows) or not k:
+        return 1.0
+    scores = vectors[rows] @ vectors.T
+    scores[np.arange(len(rows)), rows] = -np.inf
+    exact_ids, _ = _top_k(scores, k)
+    hits = sum(len(set(a) & set(e)) for a, e in zip(neighbor_ids[rows].tolist(), exact_ids.tolist()))
+    return hits / exact_ids.size
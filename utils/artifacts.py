@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+artifacts.py - On-disk layouts for the precomputed TF-IDF / SVD artifacts
+
+"compressed": gzip/xz pickles and compressed .npz in reduced precision;
+              smallest on disk, but every worker decompresses and upcasts on boot.
+"fast":       raw .npy arrays (CSC components for the TF-IDF matrix) in the
+              dtype used at query time, opened with np.load(mmap_mode="r") so
+              workers start quickly and share pages through the OS page cache.
+
+Both layouts store the TF-IDF matrix L2-normalized and term-major (CSC), as
+scored by utils/lexical.py, with the block maxima of its long posting lists,
+int8 codes of the doc vectors (utils/quantize.py) for ANN scoring, and the
+term-major float32 query projection (utils/projection.py). The fast layout
+keeps the SVD components only as that projection, unless it is pruned
+(SCOUT_PROJECTION_DENSITY < 1): then the exact components are stored beside
+it, so fold-ins and reloads of the model never start from pruned ones.
+"""
+import gzip
+import lzma
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csc_matrix
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from utils.lexical import BlockMaxima, corpus_matrix
+from utils.projection import PROJECTION_DENSITY, QueryProjection
+from utils.quantize import QuantizedVectors
+
+FORMATS = ("fast", "compressed")
+
+# Orientation / normalization of the stored TF-IDF matrix; versions written with
+# another layout are refit rather than loaded
+TFIDF_LAYOUT = "csc-l2-blockmax"
+
+# Encoding of the doc-vector codes; versions without them are rebuilt
+VECTOR_CODES = "int8-per-dim"
+
+# Reduced precision used by the compressed layout
+SPARSE_DTYPE_ON_DISK = np.float32
+DENSE_DTYPE_ON_DISK = np.float16
+SVD_DTYPE_ON_DISK = np.float16
+
+# Query-time dtype, stored as-is by the fast layout
+QUERY_DTYPE = np.float32
+
+# Neighbour graph: int32 ids (-1 = padding) and float16 scores, both layouts
+NEIGHBOR_ID_DTYPE = np.int32
+NEIGHBOR_SCORE_DTYPE = np.float16
+
+COMPRESSED_FILES = {
+    "vectorizer": "tfidf_vectorizer.pkl.gz",
+    "tfidf_matrix": "tfidf_matrix_fp16.npz",
+    "svd": "svd_model.xz",
+    "doc_vectors": "doc_vectors_fp16.npz",
+    "neighbors": "neighbors.npz",
+    "block_maxima": "tfidf_block_max.npz",
+    "vector_codes": "doc_vectors_int8",
+    "query_projection": "query_projection",
+}
+
+FAST_DIR = "fast"
+FAST_FILES = {
+    "vectorizer": "tfidf_vectorizer.pkl",
+    "tfidf_data": "tfidf_csc_data.npy",
+    "tfidf_indices": "tfidf_csc_indices.npy",
+    "tfidf_indptr": "tfidf_csc_indptr.npy",
+    "tfidf_shape": "tfidf_shape.npy",
+    "svd_meta": "svd_meta.pkl",
+    "svd_components": "svd_components.npy",  # only with a pruned query projection
+    "doc_vectors": "doc_vectors.npy",
+    "neighbor_ids": "neighbor_ids.npy",
+    "neighbor_scores": "neighbor_scores.npy",
+    "block_maxima": "tfidf_block_max.npz",
+    "vector_codes": "doc_vectors_int8",
+    "query_projection": "query_projection",
+}
+
+
+def artifact_paths(directory, fmt):
+    """Map of artifact name -> path for the given layout"""
+    directory = Path(directory)
+    if fmt == "compressed":
+        return {name: directory / fname for name, fname in COMPRESSED_FILES.items()}
+    if fmt == "fast":
+        return {name: directory / FAST_DIR / fname for name, fname in FAST_FILES.items()}
+    raise ValueError(f"Unknown artifact format: {fmt!r} (expected one of {FORMATS})")
+
+
+def _svd_meta(svd):
+    return {
+        'singular_values_': svd.singular_values_.astype(np.float32),
+        'explained_variance_': svd.explained_variance_.astype(np.float32),
+        'explained_variance_ratio_': svd.explained_variance_ratio_.astype(np.float32),
+        'n_components': svd.n_components,
+        'n_features_in_': svd.n_features_in_,
+        'algorithm': svd.algorithm,
+        'random_state': svd.random_state
+    }
+
+
+def _restore_svd(meta, components, dtype):
+    svd = TruncatedSVD(
+        n_components=meta['n_components'],
+        algorithm=meta['algorithm'],
+        random_state=meta['random_state']
+    )
+    svd.components_ = components
+    svd.singular_values_ = meta['singular_values_'].astype(dtype)
+    svd.explained_variance_ = meta['explained_variance_'].astype(dtype)
+    svd.explained_variance_ratio_ = meta['explained_variance_ratio_'].astype(dtype)
+    svd.n_features_in_ = meta['n_features_in_']
+    return svd
+
+
+def _strip_vectorizer(vectorizer):
+    # stop_words_ only serves introspection and grows with the corpus
+    if hasattr(vectorizer, "stop_words_"):
+        vectorizer.stop_words_ = None
+    return vectorizer
+
+
+def _save_npy(path, array):
+    # Write beside the target and rename over it: a serving process may still
+    # have the old file mapped, and truncating it in place would break its pages
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as fh:
+        np.save(fh, array)
+    os.replace(tmp_path, path)
+
+
+def save(directory, fmt, vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores):
+    """Write the artifacts in the given layout"""
+    paths = artifact_paths(directory, fmt)
+    _strip_vectorizer(vectorizer)
+    neighbor_ids = np.ascontiguousarray(neighbor_ids, dtype=NEIGHBOR_ID_DTYPE)
+    neighbor_scores = np.ascontiguousarray(neighbor_scores, dtype=NEIGHBOR_SCORE_DTYPE)
+    tfidf_matrix = corpus_matrix(tfidf_matrix)
+    paths["block_maxima"].parent.mkdir(parents=True, exist_ok=True)
+    BlockMaxima.build(tfidf_matrix).save(paths["block_maxima"])
+    QuantizedVectors.build(doc_vectors).save(paths["vector_codes"])
+    QueryProjection.from_components(svd.components_).save(paths["query_projection"])
+
+    if fmt == "compressed":
+        with gzip.open(paths["vectorizer"], "wb", compresslevel=9) as fh:
+            pickle.dump(vectorizer, fh)
+        sparse.save_npz(paths["tfidf_matrix"], tfidf_matrix.astype(SPARSE_DTYPE_ON_DISK))
+
+        svd_components = _svd_meta(svd)
+        svd_components['components_'] = svd.components_.astype(SVD_DTYPE_ON_DISK)
+        with lzma.open(paths["svd"], 'wb', preset=9) as f:
+            pickle.dump(svd_components, f)
+
+        np.savez_compressed(paths["doc_vectors"], doc_vectors.astype(DENSE_DTYPE_ON_DISK))
+        np.savez_compressed(paths["neighbors"], ids=neighbor_ids, scores=neighbor_scores)
+        return
+
+    with open(paths["vectorizer"], "wb") as fh:
+        pickle.dump(vectorizer, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _save_npy(paths["tfidf_data"], tfidf_matrix.data)
+    _save_npy(paths["tfidf_indices"], tfidf_matrix.indices)
+    _save_npy(paths["tfidf_indptr"], tfidf_matrix.indptr)
+    _save_npy(paths["tfidf_shape"], np.array(tfidf_matrix.shape, dtype=np.int64))
+
+    with open(paths["svd_meta"], "wb") as fh:
+        pickle.dump(_svd_meta(svd), fh, protocol=pickle.HIGHEST_PROTOCOL)
+    if PROJECTION_DENSITY < 1:
+        _save_npy(paths["svd_components"], np.ascontiguousarray(svd.components_, dtype=QUERY_DTYPE))
+
+    _save_npy(paths["doc_vectors"], np.ascontiguousarray(doc_vectors, dtype=QUERY_DTYPE))
+    _save_npy(paths["neighbor_ids"], neighbor_ids)
+    _save_npy(paths["neighbor_scores"], neighbor_scores)
+
+
+def load(directory, fmt, with_svd=True):
+    """Read the artifacts of the given layout.
+
+    Returns (vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids,
+    neighbor_scores) with float32 matrices, an L2-normalized CSC tfidf_matrix
+    and L2-normalized doc_vectors. Serving projects queries with
+    load_query_projection() instead and passes with_svd=False (svd is None).
+    """
+    paths = artifact_paths(directory, fmt)
+
+    if fmt == "compressed":
+        with gzip.open(paths["vectorizer"], "rb") as fh:
+            vectorizer = pickle.load(fh)
+        tfidf_matrix = csc_matrix(sparse.load_npz(paths["tfidf_matrix"]), dtype=QUERY_DTYPE)
+
+        svd = None
+        if with_svd:
+            with lzma.open(paths["svd"], 'rb') as f:
+                svd_components = pickle.load(f)
+            svd = _restore_svd(svd_components, svd_components['components_'].astype(QUERY_DTYPE), QUERY_DTYPE)
+
+        doc_vectors = np.load(paths["doc_vectors"])["arr_0"].astype(QUERY_DTYPE)
+        doc_vectors = normalize(doc_vectors, axis=1)
+        with np.load(paths["neighbors"]) as neighbors:
+            neighbor_ids, neighbor_scores = neighbors["ids"], neighbors["scores"]
+        return vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores
+
+    with open(paths["vectorizer"], "rb") as fh:
+        vectorizer = pickle.load(fh)
+
+    shape = tuple(int(n) for n in np.load(paths["tfidf_shape"]))
+    tfidf_matrix = csc_matrix(
+        (
+            np.load(paths["tfidf_data"], mmap_mode="r"),
+            np.load(paths["tfidf_indices"], mmap_mode="r"),
+            np.load(paths["tfidf_indptr"], mmap_mode="r"),
+        ),
+        shape=shape,
+        copy=False,
+    )
+
+    svd = None
+    if with_svd:
+        with open(paths["svd_meta"], "rb") as fh:
+            svd_meta = pickle.load(fh)
+        if paths["svd_components"].exists():
+            components = np.load(paths["svd_components"], mmap_mode="r")
+        else:
+            # Unpruned, the components are the query projection's, transposed (stored once)
+            projection = QueryProjection.load(paths["query_projection"])
+            components = (projection.matrix.toarray() if projection.sparse else projection.matrix).T
+        svd = _restore_svd(svd_meta, components, QUERY_DTYPE)
+
+    doc_vectors = np.load(paths["doc_vectors"], mmap_mode="r")
+    neighbor_ids = np.load(paths["neighbor_ids"], mmap_mode="r")
+    neighbor_scores = np.load(paths["neighbor_scores"], mmap_mode="r")
+    return vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores
+
+
+def load_block_maxima(directory, fmt):
+    """Block maxima of the stored TF-IDF matrix (see utils/lexical.py)"""
+    return BlockMaxima.load(artifact_paths(directory, fmt)["block_maxima"])
+
+
+def load_vector_codes(directory, fmt):
+    """int8 codes of the doc vectors (see utils/quantize.py), memory-mapped"""
+    return QuantizedVectors.load(artifact_paths(directory, fmt)["vector_codes"])
+
+
+def load_query_projection(directory, fmt):
+    """Term-major SVD projection for queries (see utils/projection.py), memory-mapped"""
+    return QueryProjection.load(artifact_paths(directory, fmt)["query_projection"])
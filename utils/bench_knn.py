@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark: kNN graph construction vs worker threads on a synthetic corpus
+Usage: python -m utils.bench_knn [--jobs 100000] [--dims 100] [--engine brute,ivf]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from utils import ann
+from utils.ann import build_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--dims", type=int, default=100)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--engine", default="brute,ivf")
+    parser.add_argument("--block-mb", type=int, default=ann.KNN_BLOCK_BYTES // (1024 * 1024))
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    ann.KNN_BLOCK_BYTES = args.block_mb * 1024 * 1024
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.jobs, args.dims), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    workers = [1]
+    while workers[-1] * 2 <= args.max_workers:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != args.max_workers:
+        workers.append(args.max_workers)
+
+    print(f"Synthetic corpus: {args.jobs:,} x {args.dims} vectors, k={args.k}, "
+          f"score blocks <= {args.block_mb} MB per worker")
+    print(f"{'engine':<8}{'workers':>8}{'seconds':>10}{'speedup':>10}")
+    for engine in args.engine.split(","):
+        index = build_index(engine, vectors)
+        baseline = reference = None
+        for n_workers in workers:
+            start = time.perf_counter()
+            ids, _ = index.knn_graph(args.k, workers=n_workers)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                baseline, reference = elapsed, ids
+            assert np.array_equal(ids, reference), "parallel graph differs from the serial one"
+            print(f"{engine:<8}{n_workers:>8}{elapsed:>10.2f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
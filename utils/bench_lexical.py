@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exhaustive term-at-a-time vs block-max pruned TF-IDF top-K on a synthetic corpus
+Usage: python -m utils.bench_lexical [--jobs 200000] [--queries 200] [--k 50]
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from utils.lexical import BlockMaxima, LexicalIndex, corpus_matrix
+
+
+def same_top_k(ids, scores, ref_ids, ref_scores):
+    """Equal scores (up to float32 summation order), and equal ids apart from
+    jobs tied at the k-th score"""
+    if len(scores) != len(ref_scores) or not np.allclose(scores, ref_scores, rtol=1e-6, atol=0):
+        return False
+    above = ref_scores > ref_scores[-1] * (1 + 1e-6) if len(ref_scores) else ref_scores
+    return set(ids[above].tolist()) == set(ref_ids[above].tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200_000)
+    parser.add_argument("--words", type=int, default=20_000)
+    parser.add_argument("--length", type=int, default=60, help="words per job")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    args = parser.parse_args()
+
+    # Zipf-distributed vocabulary, so a few head terms occur in most jobs
+    rng = np.random.default_rng(42)
+    words = np.array([f"w{i}" for i in range(args.words)])
+    p = 1 / np.arange(1, args.words + 1) ** 1.05
+    p /= p.sum()
+    docs = (" ".join(words[rng.choice(args.words, args.length, p=p)]) for _ in range(args.jobs))
+    vectorizer = TfidfVectorizer(max_df=0.7)
+    matrix = corpus_matrix(vectorizer.fit_transform(docs))
+
+    start = time.perf_counter()
+    block_maxima = BlockMaxima.build(matrix)
+    build_seconds = time.perf_counter() - start
+    index = LexicalIndex(matrix, block_maxima)
+    print(f"Synthetic corpus: {args.jobs:,} jobs, {matrix.shape[1]:,} terms, {matrix.nnz:,} postings; "
+          f"block maxima for {len(block_maxima.terms):,} lists in {build_seconds:.2f}s")
+
+    # Head queries (frequent terms, mixed with a rarer one) and tail queries
+    head = [" ".join(words[rng.integers(0, 30, 2)]) + " " + words[rng.integers(30, 3000)]
+            for _ in range(args.queries)]
+    tail = [" ".join(words[rng.integers(1000, args.words, 2)]) for _ in range(args.queries)]
+
+    exhaustive_index = LexicalIndex(matrix)
+    print(f"{'queries':<10}{'postings/q':>12}{'exhaustive ms':>15}{'pruned ms':>11}{'speedup':>10}")
+    for label, queries in (("head", head), ("tail", tail)):
+        query_tfidf = vectorizer.transform(queries)
+        postings = np.diff(index.offsets)[query_tfidf.indices].sum() // len(queries)
+        exhaustive = pruned = 0.0
+        for row in range(query_tfidf.shape[0]):
+            query = query_tfidf[row]
+            start = time.perf_counter()
+            (ref_ids,), (ref_scores,) = exhaustive_index.top_candidates(query, args.k)
+            exhaustive += time.perf_counter() - start
+
+            start = time.perf_counter()
+            (ids,), (scores,) = index.top_candidates(query, args.k)
+            pruned += time.perf_counter() - start
+            assert same_top_k(ids, scores, ref_ids, ref_scores), f"pruned top-{args.k} differs for {queries[row]!r}"
+
+        n = len(queries)
+        print(f"{label:<10}{postings:>12,}{1000 * exhaustive / n:>15.2f}{1000 * pruned / n:>11.2f}"
+              f"{exhaustive / pruned:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
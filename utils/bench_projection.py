@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark: TruncatedSVD.transform + normalize vs the term-major float32 query projection
+Usage: python -m utils.bench_projection [--terms 200000] [--components 100] [--queries 500] [--density 0.25]
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import random as sparse_random
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from utils.projection import QueryProjection, fidelity
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for row in range(queries.shape[0]):
+        fn(queries[row])
+    return 1000 * (time.perf_counter() - start) / queries.shape[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--terms", type=int, default=200_000)
+    parser.add_argument("--components", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--query-terms", type=int, default=6)
+    parser.add_argument("--density", type=float, default=0.25, help="share of loadings kept when pruned")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    components = rng.standard_normal((args.components, args.terms)) / np.sqrt(args.terms)
+    # How the compressed layout used to restore the model: float64 components
+    svd = TruncatedSVD(n_components=args.components)
+    svd.components_ = components.astype(np.float64)
+    queries = normalize(sparse_random(
+        args.queries, args.terms, density=args.query_terms / args.terms, format="csr", random_state=42
+    ))
+
+    dense = QueryProjection.from_components(components)
+    pruned = QueryProjection.from_components(components, args.density)
+    rows = [
+        ("svd.transform f64", svd.components_.nbytes, timed(lambda q: normalize(svd.transform(q)), queries), 1.0),
+        ("projection f32", dense.stats()["bytes"], timed(dense.project, queries), 1.0),
+        (f"pruned {args.density:g}", pruned.stats()["bytes"], timed(pruned.project, queries),
+         fidelity(dense, pruned, queries)),
+    ]
+    print(f"{args.terms:,} terms x {args.components} components, {args.query_terms} terms per query")
+    print(f"{'path':<20}{'MiB':>8}{'us/query':>10}{'cosine':>9}")
+    for label, nbytes, ms, cosine in rows:
+        print(f"{label:<20}{nbytes / 2**20:>8.1f}{1000 * ms:>10.1f}{cosine:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
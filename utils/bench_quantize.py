@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: float32 vs int8 (optionally re-ranked) exact inner-product search on synthetic SVD-like vectors
+Usage: python -m utils.bench_quantize [--jobs 200000] [--dims 100] [--queries 200] [--k 15]
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from utils.quantize import QuantizedVectors, recall_report
+from utils.topk import top_k_with_scores
+
+
+def timed(fn, queries, batch):
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        fn(queries[i:i + batch])
+    return 1000 * (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200_000)
+    parser.add_argument("--dims", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--batch", type=int, default=1, help="queries per call")
+    args = parser.parse_args()
+
+    # Decaying variance per dimension and a shared positive first component,
+    # like the leading singular vectors of a TF-IDF matrix
+    rng = np.random.default_rng(42)
+    spread = 1 / np.sqrt(np.arange(1, args.dims + 1))
+    vectors = rng.standard_normal((args.jobs, args.dims)).astype(np.float32) * spread
+    vectors[:, 0] = np.abs(vectors[:, 0]) + 1
+    vectors = normalize(vectors).astype(np.float32)
+    queries = vectors[rng.choice(args.jobs, args.queries, replace=False)]
+
+    start = time.perf_counter()
+    codes = QuantizedVectors.build(vectors)
+    print(f"Synthetic vectors: {args.jobs:,} x {args.dims}; float32 {vectors.nbytes / 2**20:.1f} MiB, "
+          f"int8 {codes.codes.nbytes / 2**20:.1f} MiB, encoded in {time.perf_counter() - start:.2f}s")
+
+    float_ms = timed(lambda q: top_k_with_scores(q @ vectors.T, args.k), queries, args.batch)
+    int8_ms = timed(lambda q: codes.search(q, args.k, rerank=0), queries, args.batch)
+    rerank_ms = timed(lambda q: codes.search(q, args.k, vectors=vectors), queries, args.batch)
+    report = recall_report(vectors, codes, queries, args.k)
+
+    print(f"{'path':<16}{'ms/query':>10}{'recall@' + str(args.k):>12}")
+    print(f"{'float32':<16}{float_ms:>10.2f}{1.0:>12.4f}")
+    print(f"{'int8':<16}{int8_ms:>10.2f}{report['recall_int8']:>12.4f}")
+    print(f"{'int8 + rerank':<16}{rerank_ms:>10.2f}{report['recall_reranked']:>12.4f}")
+    print(f"max |score error| (int8): {report['max_abs_error']:.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: full argsort vs partial top-K selection on a synthetic corpus
+Usage: python -m utils.bench_topk [--jobs 500000] [--batch 32]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.topk import top_k
+
+
+def best_of(fn, repeats):
+    """Best wall-clock time of `repeats` runs, in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=500_000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    scores = rng.random(args.jobs, dtype=np.float32)
+    batch = rng.random((args.batch, args.jobs), dtype=np.float32)
+
+    print(f"Synthetic corpus: {args.jobs:,} jobs, batch of {args.batch} queries")
+    print(f"{'case':<28}{'argsort ms':>12}{'top_k ms':>12}{'speedup':>10}")
+    for k in (5, 50, 1000):
+        expected = np.argsort(scores)[::-1][:k]
+        assert np.array_equal(np.sort(scores[expected]), np.sort(scores[top_k(scores, k)]))
+
+        full = best_of(lambda: np.argsort(scores)[::-1][:k], args.repeats)
+        partial = best_of(lambda: top_k(scores, k), args.repeats)
+        print(f"{f'single query, K={k}':<28}{full:>12.2f}{partial:>12.2f}{full / partial:>9.1f}x")
+
+    for k in (5, 50):
+        full = best_of(lambda: np.argsort(batch, axis=1)[:, ::-1][:, :k], args.repeats)
+        partial = best_of(lambda: top_k(batch, k), args.repeats)
+        print(f"{f'batched, K={k}':<28}{full:>12.2f}{partial:>12.2f}{full / partial:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vocabulary strategies - index size, load time and query latency vs retrieval quality
+Each strategy builds a full index for the corpus in a scratch root (settings
+are read from the environment at import, so every build runs in its own
+process). Quality is measured against the "full" vocabulary: overlap of the
+ranked /search results, and how often a job's own title ranks it in the results.
+Usage: python -m utils.bench_vocabulary [--corpus init.json] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# name -> environment overrides
+STRATEGIES = {
+    "full": {"SCOUT_VOCABULARY": "full"},
+    "pruned min_df=2": {"SCOUT_VOCABULARY": "pruned", "SCOUT_VOCAB_MIN_DF": "2"},
+    "pruned max=500": {"SCOUT_VOCABULARY": "pruned", "SCOUT_VOCAB_MIN_DF": "1", "SCOUT_VOCAB_MAX_FEATURES": "500"},
+    "hashed 2^10": {"SCOUT_VOCABULARY": "hashed", "SCOUT_HASH_FEATURES": str(1 << 10)},
+    "hashed 2^14": {"SCOUT_VOCABULARY": "hashed", "SCOUT_HASH_FEATURES": str(1 << 14)},
+    "hashed 2^18": {"SCOUT_VOCABULARY": "hashed", "SCOUT_HASH_FEATURES": str(1 << 18)},
+}
+
+
+# Results scoring at most this are left out of the quality comparison
+MIN_SCORE = 1e-6
+
+
+def tree_bytes(path):
+    path = Path(path)
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) if path.is_dir() else path.stat().st_size
+
+
+def measure(root, repeat):
+    """Build and load the index under `root`; returns sizes, timings and rankings"""
+    from utils import artifacts, precompute
+    from utils.generation import IndexGeneration, load_artifacts
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        generation = IndexGeneration.load(root)
+        version_dir = precompute.current_version_dir(Path(root) / "precomputed")
+        manifest = precompute.read_manifest(version_dir)
+        load_seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load_artifacts(version_dir, manifest)
+            load_seconds.append(time.perf_counter() - start)
+
+    paths = artifacts.artifact_paths(version_dir, manifest["format"])
+    jobs = [generation.jobs[i] for i in range(len(generation))]
+    queries = [job["title"] for job in jobs] + [" ".join(job.get("skills", [])[:2]) for job in jobs]
+    latencies, rankings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query_tfidf = generation.vectorizer.transform([query])
+            ids, scores = generation.rank_queries(query_tfidf)
+        latencies.append((time.perf_counter() - start) / repeat)
+        # Jobs sharing no term with the query score ~0 and are ranked arbitrarily
+        rankings.append([int(i) for i, s in zip(ids[0], scores[0]) if s > MIN_SCORE] if query_tfidf.nnz else [])
+    return {
+        "features": generation.projection.n_terms,
+        "vectorizer_bytes": tree_bytes(paths["vectorizer"]),
+        "index_bytes": sum(tree_bytes(p) for p in paths.values() if p.exists()),
+        "load_ms": 1000 * statistics.median(load_seconds),
+        "query_us": 1e6 * statistics.median(latencies),
+        "titles": len(jobs),
+        "rankings": rankings,
+    }
+
+
+def overlap(rankings, reference):
+    pairs = [(set(r), set(ref)) for r, ref in zip(rankings, reference) if ref]
+    return sum(len(r & ref) / len(ref) for r, ref in pairs) / max(len(pairs), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default="init.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)  # child: measure this root
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="scout-vocab-") as scratch:
+        for name, overrides in STRATEGIES.items():
+            root = Path(scratch) / str(len(results))
+            root.mkdir()
+            shutil.copy(args.corpus, root / "init.json")
+            env = {**os.environ, **overrides, "SCOUT_ARTIFACT_FORMAT": "fast"}
+            child = subprocess.run(
+                [sys.executable, "-m", "utils.bench_vocabulary", "--measure", str(root), "--repeat", str(args.repeat)],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            results[name] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    reference = results["full"]["rankings"]
+    print(f"{'strategy':<18}{'features':>10}{'vectorizer KiB':>16}{'index KiB':>11}{'load ms':>9}"
+          f"{'query us':>10}{'overlap':>9}{'title hit':>11}")
+    for name, r in results.items():
+        titles = r["titles"]
+        hits = sum(job in ranking for job, ranking in enumerate(r["rankings"][:titles])) / max(titles, 1)
+        print(f"{name:<18}{r['features']:>10,}{r['vectorizer_bytes'] / 1024:>16.1f}{r['index_bytes'] / 1024:>11.1f}"
+              f"{r['load_ms']:>9.2f}{r['query_us']:>10.0f}{overlap(r['rankings'], reference):>9.3f}{hits:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
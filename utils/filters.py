@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+filters.py - Structured result filters over the columnar job store
+Salary bounds, experience level, company and required skills are resolved
+to a boolean job mask from precomputed structures (salary columns sorted
+once, posting lists per category value and the skill index's posting lists),
+and the mask is applied to the scores before top-K selection. Masks are
+cached per distinct filter.
+"""
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from utils.job_store import MISSING
+from utils.text import normalize_text
+
+# Distinct filters whose job masks are kept per generation
+FILTER_CACHE_SIZE = int(os.environ.get("SCOUT_FILTER_CACHE_SIZE", "256"))
+
+
+def split_values(values):
+    """Comma-separated and/or repeated query parameters as a list of values"""
+    return [part.strip() for value in values for part in value.split(",") if part.strip()]
+
+
+class JobFilter:
+    """A structured filter as given on /search and /map_data.
+
+    min_salary / max_salary keep jobs whose listed salary range overlaps the
+    bound (jobs without a salary are dropped); experience_level matches any of
+    the given levels; company matches exactly (ignoring case); skills must all
+    be listed on the job.
+    """
+
+    def __init__(self, min_salary=None, max_salary=None, experience_levels=(), company=None, skills=()):
+        self.min_salary = min_salary
+        self.max_salary = max_salary
+        self.experience_levels = tuple(sorted({normalize_text(v) for v in experience_levels}))
+        self.company = normalize_text(company) or None
+        self.skills = tuple(sorted({normalize_text(v) for v in skills}))
+
+    @classmethod
+    def from_args(cls, args):
+        """Filter from request query parameters; ValueError on a malformed salary"""
+        def salary(name):
+            value = args.get(name, "").strip()
+            if not value:
+                return None
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            return int(number)
+
+        return cls(
+            min_salary=salary("min_salary"),
+            max_salary=salary("max_salary"),
+            experience_levels=split_values(args.getlist("experience_level")),
+            company=args.get("company"),
+            skills=split_values(args.getlist("skills")),
+        )
+
+    def key(self):
+        return (self.min_salary, self.max_salary, self.experience_levels, self.company, self.skills)
+
+    def cache_params(self):
+        """Query-cache key parameters; values are strings so a bound of 0 still counts"""
+        params = {
+            "min_salary": self.min_salary,
+            "max_salary": self.max_salary,
+            "experience_level": ",".join(self.experience_levels),
+            "company": self.company,
+            "skills": ",".join(self.skills),
+        }
+        return {name: str(value) for name, value in params.items() if value not in (None, "")}
+
+    def __bool__(self):
+        return any(value not in (None, ()) for value in self.key())
+
+
+class Postings:
+    """Sorted job ids of every code of an integer column, in CSR form"""
+
+    def __init__(self, offsets, job_ids):
+        self.offsets = offsets
+        self.job_ids = job_ids
+
+    @classmethod
+    def build(cls, codes, rows, n_codes):
+        """Postings of (row, code) pairs; rows with MISSING codes are skipped"""
+        keep = codes != MISSING
+        codes, rows = codes[keep], rows[keep]
+        order = np.argsort(codes, kind="stable")
+        offsets = np.zeros(n_codes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_codes), out=offsets[1:])
+        return cls(offsets, rows[order].astype(np.int32))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def jobs(self, code):
+        return self.job_ids[self.offsets[code]:self.offsets[code + 1]]
+
+
+def _codes_by_value(table):
+    """normalized value -> category codes (several raw spellings may normalize alike)"""
+    codes = {}
+    for code, value in enumerate(table):
+        codes.setdefault(normalize_text(value), []).append(code)
+    return codes
+
+
+class FilterIndex:
+    """Precomputed per-generation structures that turn a JobFilter into a job mask"""
+
+    def __init__(self, jobs, skill_postings):
+        self.n_jobs = n = len(jobs)
+        salary_min = np.asarray(jobs.salary_min)
+        salary_max = np.asarray(jobs.salary_max)
+        # A job's salary range; a single listed bound is used for both ends
+        low = np.where(salary_min > 0, salary_min, salary_max)
+        high = np.where(salary_max > 0, salary_max, salary_min)
+        listed = np.flatnonzero(high > 0)
+        self._by_low = listed[np.argsort(low[listed], kind="stable")]
+        self._sorted_low = low[self._by_low]
+        self._by_high = listed[np.argsort(high[listed], kind="stable")]
+        self._sorted_high = high[self._by_high]
+
+        rows = np.arange(n, dtype=np.int32)
+        self.postings = {}
+        self.values = {}
+        for field in ("experience_level", "company"):
+            table = jobs.categories[field]
+            self.postings[field] = Postings.build(np.asarray(jobs.codes[field]), rows, len(table))
+            self.values[field] = _codes_by_value(table)
+        self.postings["skills"] = skill_postings
+        self.values["skills"] = _codes_by_value(jobs.skill_vocab)
+
+        self._cached_mask = lru_cache(maxsize=FILTER_CACHE_SIZE)(self._mask)
+
+    def mask(self, job_filter):
+        """Read-only boolean mask of the jobs passing `job_filter`, or None for no filter"""
+        if not job_filter:
+            return None
+        return self._cached_mask(job_filter.key())
+
+    def cache_info(self):
+        return self._cached_mask.cache_info()._asdict()
+
+    def _jobs_with(self, field, value):
+        postings = self.postings[field]
+        codes = self.values[field].get(value, [])
+        if not codes:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([postings.jobs(code) for code in codes])
+
+    def _mask(self, key):
+        min_salary, max_salary, experience_levels, company, skills = key
+        # Each clause is the id list of its matching jobs; the mask is their intersection
+        clauses = []
+        if min_salary is not None:
+            clauses.append(self._by_high[np.searchsorted(self._sorted_high, min_salary, side="left"):])
+        if max_salary is not None:
+            clauses.append(self._by_low[:np.searchsorted(self._sorted_low, max_salary, side="right")])
+        if experience_levels:
+            clauses.append(np.concatenate([self._jobs_with("experience_level", v) for v in experience_levels]))
+        if company:
+            clauses.append(self._jobs_with("company", company))
+        clauses.extend(self._jobs_with("skills", skill) for skill in skills)
+
+        # Start from the most selective clause, then narrow it down
+        clauses.sort(key=len)
+        mask = np.zeros(self.n_jobs, dtype=bool)
+        mask[clauses[0]] = True
+        for ids in clauses[1:]:
+            if not mask.any():
+                break
+            narrowed = np.zeros(self.n_jobs, dtype=bool)
+            narrowed[ids] = True
+            mask &= narrowed
+        mask.flags.writeable = False
+        return mask
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+generation.py - One generation of the Scout search index
+Everything derived from a corpus (job records, lookup indexes, filter
+index, TF-IDF / SVD models, ANN index, neighbour graph, keyword and skill
+indexes and rendered response fragments) lives on an IndexGeneration, loaded from a published version
+built by utils/precompute.py. A new generation can be loaded in the
+background and swapped in atomically; requests that already hold the old
+generation finish on it.
+"""
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from utils import artifacts, precompute
+from utils.filters import FilterIndex
+from utils.job_store import JobStore
+from utils.keyword_index import KeywordIndex
+from utils.lexical import LexicalIndex
+from utils.quantize import load_report
+from utils.skill_index import SkillIndex
+from utils.vocabulary import vocabulary_stats
+from utils.serialization import dumps, join_array, join_object
+from utils.text import normalize_text
+from utils.timing import PhaseTimer
+from utils.topk import top_k_with_scores
+
+# Serve-only mode: load the published version and never build; artifacts come
+# from `python -m utils.precompute`. Otherwise a stale index is rebuilt on load.
+SERVE_ONLY = os.environ.get("SCOUT_SERVE_ONLY", "0") == "1"
+
+# Search scoring: candidates taken by TF-IDF, lexical vs latent weight,
+# salary boost strength and number of results returned
+SEARCH_CANDIDATES = int(os.environ.get("SCOUT_SEARCH_CANDIDATES", "50"))
+SEARCH_ALPHA = 0.8
+SALARY_BOOST_FACTOR = 0.2
+SEARCH_RESULTS = 7
+KEYWORD_FALLBACK_RESULTS = 5
+
+# /skills: default and maximum number of jobs and related skills returned
+SKILL_JOBS = 20
+SKILL_RELATED = 10
+SKILL_RESULTS_MAX = 100
+
+# Queries scored per matrix multiply in search_bodies()
+SEARCH_BATCH_CHUNK = 64
+
+# Per-job pre-rendered JSON fragments kept in each generation's LRUs
+CARD_CACHE_SIZE = int(os.environ.get("SCOUT_CARD_CACHE_SIZE", "4096"))
+
+
+# Exact-match lookup indexes
+def build_lookup_indexes(jobs):
+    """Build normalized title -> [indices] and (title, company) -> index maps"""
+    by_title = {}
+    by_title_company = {}
+    for idx, job in enumerate(jobs):
+        title_key = normalize_text(job.get("title", ""))
+        company_key = normalize_text(job.get("company", ""))
+        by_title.setdefault(title_key, []).append(idx)
+        by_title_company.setdefault((title_key, company_key), idx)
+    return by_title, by_title_company
+
+
+def modified_sigmoid(x):
+    """Modified sigmoid for salary/experience scoring"""
+    a = 0.2979
+    b = -1.2902
+    return 1 / (1 + np.exp(-(a * np.log(x + 1) + b)))
+
+
+def build_salary_features(jobs):
+    """Per-job multiplicative score boost from salary, aligned with doc_vectors"""
+    salary_min = jobs.salary_min.astype(np.float64)
+    salary_max = jobs.salary_max.astype(np.float64)
+    # Median salary as a proxy for job attractiveness
+    salary_median = np.where(salary_max > 0, (salary_min + salary_max) / 2, salary_min)
+    boost = modified_sigmoid(salary_median / 1000)  # Normalize salary
+    salary_factor = 1 + SALARY_BOOST_FACTOR * np.minimum(0, boost - 0.5) * 2
+    return salary_factor
+
+
+def description_snippet(text, limit=200):
+    return (text[:limit] + " …") if len(text) > limit else text
+
+
+def load_artifacts(version_dir, manifest):
+    print(f"[load] Using pre-computed data {version_dir.name} ({manifest['format']} layout)")
+    vectorizer, tfidf_matrix, _, doc_vectors, neighbor_ids, neighbor_scores = artifacts.load(
+        version_dir, manifest["format"], with_svd=False
+    )
+    projection = artifacts.load_query_projection(version_dir, manifest["format"])
+    quantized = artifacts.load_vector_codes(version_dir, manifest["format"]) if precompute.ANN_QUANTIZED else None
+    ann_index = precompute.load_ann(version_dir, manifest["ann_engine"], doc_vectors, quantized)
+    lexical_index = LexicalIndex(tfidf_matrix, artifacts.load_block_maxima(version_dir, manifest["format"]))
+    return vectorizer, lexical_index, projection, doc_vectors, neighbor_ids, neighbor_scores, ann_index
+
+
+class IndexGeneration:
+    """An immutable snapshot of the corpus and every index built over it"""
+
+    def __init__(self, version, jobs, data_hash, vectorizer, lexical_index, projection, doc_vectors,
+                 neighbor_ids, neighbor_scores, ann_index, keyword_index, skill_index):
+        self.version = version
+        self.artifact_version = None
+        self.vector_codes_recall = None
+        self.load_timings = {}
+        self.loaded_at = time.time()
+        self.jobs = jobs
+        self.data_hash = data_hash
+        self.vectorizer = vectorizer
+        self.lexical_index = lexical_index
+        self.projection = projection
+        self.document_vectors_normalized = doc_vectors
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.ann_index = ann_index
+        self.keyword_index = keyword_index
+        self.skill_index = skill_index
+
+        self.title_index, self.title_company_index = build_lookup_indexes(jobs)
+        print(f"[index] ✓  {len(self.title_index):,} distinct titles")
+        self.salary_factor_arr = build_salary_features(jobs)
+        self.filter_index = FilterIndex(jobs, skill_index.postings)
+
+        # Per-generation fragment LRUs: job ids are only meaningful within a generation
+        self.job_record_json = lru_cache(maxsize=CARD_CACHE_SIZE)(self._job_record_json)
+        self.center_card_json = lru_cache(maxsize=CARD_CACHE_SIZE)(self._center_card_json)
+        self.related_cards_json = lru_cache(maxsize=CARD_CACHE_SIZE)(self._related_cards_json)
+        self.job_as_query_json = lru_cache(maxsize=CARD_CACHE_SIZE)(self._job_as_query_json)
+
+    @classmethod
+    def load(cls, root, version=1):
+        """Load the published index version under `root`/precomputed.
+
+        Unless SERVE_ONLY is set, the version is first rebuilt if it does not
+        match `root`/init.json (see precompute.build).
+        """
+        timer = PhaseTimer("startup")
+        precompute_dir = Path(root) / "precomputed"
+        if SERVE_ONLY:
+            version_dir = precompute.current_version_dir(precompute_dir)
+            if version_dir is None:
+                raise RuntimeError(
+                    f"No published index under {precompute_dir} – run `python -m utils.precompute` first"
+                )
+        else:
+            with timer.phase("build_check"):
+                version_dir = precompute.build(root)
+
+        manifest = precompute.read_manifest(version_dir)
+        with timer.phase("jobs"):
+            jobs = JobStore.load(version_dir / manifest["jobs_store"])
+        with timer.phase("artifacts"):
+            bundle = load_artifacts(version_dir, manifest)
+        with timer.phase("keyword_index"):
+            keyword_index = KeywordIndex.load(version_dir / manifest["keyword_index"])
+        with timer.phase("skill_index"):
+            skill_index = SkillIndex.load(version_dir / manifest["skill_index"])
+        with timer.phase("features"):
+            generation = cls(version, jobs, manifest["data_hash"], *bundle, keyword_index, skill_index)
+        generation.artifact_version = version_dir.name
+        generation.vector_codes_recall = load_report(version_dir)
+        generation.load_timings = timer.report()
+        return generation
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "artifact_version": self.artifact_version,
+            "data_hash": self.data_hash,
+            "jobs": self.jobs.stats(),
+            "loaded_at": self.loaded_at,
+            "load_timings": self.load_timings,
+            "vocabulary": vocabulary_stats(self.vectorizer),
+            "lexical": self.lexical_index.stats(),
+            "projection": self.projection.stats(),
+            "ann": self.ann_index.stats(),
+            "vector_codes_recall": self.vector_codes_recall,
+            "skills": self.skill_index.stats(),
+        }
+
+    # Lookups
+    def find_exact_matches(self, title, company=None, mask=None):
+        """Return indices of jobs whose title (and company, if given) match exactly.
+
+        With a filter `mask`, only matches that pass it are returned.
+        """
+        title_key = normalize_text(title)
+        if company:
+            idx = self.title_company_index.get((title_key, normalize_text(company)))
+            matches = [] if idx is None else [idx]
+        else:
+            matches = self.title_index.get(title_key, [])
+        if mask is not None:
+            matches = [idx for idx in matches if mask[idx]]
+        return matches
+
+    def filter_mask(self, job_filter):
+        """Boolean mask of the jobs passing a JobFilter, or None when it is empty"""
+        return self.filter_index.mask(job_filter)
+
+    def job_neighbors(self, job_idx):
+        """(ids, scores) of a job's precomputed nearest neighbours, padding removed"""
+        ids = self.neighbor_ids[job_idx]
+        keep = ids >= 0
+        return ids[keep], self.neighbor_scores[job_idx][keep].astype(np.float32)
+
+    # Response cards: every response dict is built fresh from the read-only job store,
+    # so concurrent requests never write to shared state
+    def _card_base(self, job_idx):
+        job = self.jobs[job_idx]
+        return {
+            "original_id": job_idx,
+            "title": job.get("title", "Unknown"),
+            "salary_min": job.get("salary_min", 0) or 0,
+            "salary_max": job.get("salary_max", 0) or 0,
+            "experience_level": job.get("experience_level", "Not specified"),
+        }
+
+    def center_card(self, job_idx, card_id=0, score=1.0):
+        """Full job card (description and skills), as used for cluster centers"""
+        job = self.jobs[job_idx]
+        return {
+            **self._card_base(job_idx),
+            "description": job.get("description", ""),
+            "skills": job.get("skills", []) or [],
+            "id": card_id,
+            "score": float(score),
+        }
+
+    def related_card(self, job_idx, score, card_id=None):
+        """Compact job card (description snippet, salary range) for related jobs"""
+        card = self._card_base(job_idx)
+        card["description"] = description_snippet(self.jobs.get(job_idx, "description", ""))
+        card["salary_range"] = f"${card['salary_min']:,} - ${card['salary_max']:,}"
+        card["id"] = job_idx if card_id is None else card_id
+        card["score"] = float(score)
+        return card
+
+    def related_cards(self, job_idx, sequential_ids=False, mask=None):
+        """Cards for a job's precomputed neighbours (those passing `mask`, if given)"""
+        ids, scores = self.job_neighbors(job_idx)
+        if mask is not None:
+            keep = mask[ids]
+            ids, scores = ids[keep], scores[keep]
+        return [
+            self.related_card(int(j), s, card_id=pos + 1 if sequential_ids else None)
+            for pos, (j, s) in enumerate(zip(ids, scores))
+        ]
+
+    # Pre-rendered JSON fragments, spliced into responses without re-encoding
+    def _job_record_json(self, job_idx):
+        return dumps(self.jobs.record(job_idx))
+
+    def _center_card_json(self, job_idx):
+        return dumps(self.center_card(job_idx))
+
+    def _related_cards_json(self, job_idx):
+        return dumps(self.related_cards(job_idx))
+
+    def _job_as_query_json(self, job_idx):
+        """Complete /job_as_query body; deterministic per job"""
+        return join_object(
+            center=self.center_card_json(job_idx),
+            related=dumps(self.related_cards(job_idx, sequential_ids=True)),
+        )
+
+    def search_result_json(self, job_idx, score):
+        """A /search result: the cached full job record fragment with the score appended"""
+        record = self.job_record_json(job_idx)
+        separator = b"" if record == b"{}" else b","
+        return record[:-1] + separator + b'"score":' + dumps(float(score)) + b"}"
+
+    def fragment_cache_info(self):
+        info = {
+            name: getattr(self, name).cache_info()._asdict()
+            for name in ("job_record_json", "center_card_json", "related_cards_json", "job_as_query_json")
+        }
+        info["filter_masks"] = self.filter_index.cache_info()
+        return info
+
+    # Search
+    def rank_queries(self, query_tfidf, mask=None):
+        """Top SEARCH_RESULTS (job indices, scores) for each row of a TF-IDF query matrix.
+
+        Jobs outside a filter `mask` are excluded before candidate selection;
+        slots they cannot fill come back with a score of -inf.
+        """
+        # Narrow down to top K by TF-IDF cosine, scored over the query terms' postings
+        top_idxs, lexical = self.lexical_index.top_candidates(query_tfidf, SEARCH_CANDIDATES, mask)
+        valid = top_idxs >= 0
+        top_idxs = np.where(valid, top_idxs, 0)
+
+        # Compute SVD-based similarity on those K
+        query_norm = self.projection.project(query_tfidf)
+        svd_scores = np.einsum("qkd,qd->qk", self.document_vectors_normalized[top_idxs], query_norm)
+
+        # Combine lexical + latent, then apply the precomputed salary boost
+        combined = SEARCH_ALPHA * lexical + (1 - SEARCH_ALPHA) * svd_scores
+        boosted = np.where(valid, combined * self.salary_factor_arr[top_idxs], -np.inf)
+
+        # Pick top N results
+        best, best_scores = top_k_with_scores(boosted, SEARCH_RESULTS)
+        return np.take_along_axis(top_idxs, best, axis=1), best_scores
+
+    def exact_match_body(self, query, company=None, mask=None):
+        """Encoded /search results for an exact title match, or None"""
+        exact = self.find_exact_matches(query, company, mask)
+        if exact:
+            return join_array([self.search_result_json(exact[0], 1.0)])
+        return None
+
+    def search_bodies(self, queries, job_filter=None):
+        """Encoded /search results for a list of (query, company) pairs.
+
+        Queries that need ranking are transformed as one sparse matrix and scored
+        together, SEARCH_BATCH_CHUNK rows at a time. A JobFilter applies to
+        every query.
+        """
+        mask = self.filter_mask(job_filter)
+        bodies = [self.exact_match_body(query, company, mask) for query, company in queries]
+        pending = [pos for pos, body in enumerate(bodies) if body is None]
+        if not pending:
+            return bodies
+
+        # Transform queries into TF-IDF
+        query_tfidf = self.vectorizer.transform([queries[pos][0] for pos in pending])
+        has_terms = np.diff(query_tfidf.indptr) > 0
+        for pos, ok in zip(pending, has_terms):
+            if not ok:
+                # Fallback keyword search (typos, out-of-vocabulary terms)
+                bodies[pos] = join_array([
+                    self.search_result_json(idx, score)
+                    for idx, score in self.keyword_index.search(queries[pos][0], KEYWORD_FALLBACK_RESULTS, mask)
+                ])
+
+        rows = np.flatnonzero(has_terms)
+        for start in range(0, len(rows), SEARCH_BATCH_CHUNK):
+            chunk = rows[start:start + SEARCH_BATCH_CHUNK]
+            ids, scores = self.rank_queries(query_tfidf[chunk], mask)
+            for row, row_ids, row_scores in zip(chunk, ids, scores):
+                bodies[pending[row]] = join_array([
+                    self.search_result_json(i, s) for i, s in zip(row_ids, row_scores) if s > -np.inf
+                ])
+
+        print(f"Search ranked {len(rows)} of {len(queries)} queries")
+        return bodies
+
+    def search_body(self, query, company=None, job_filter=None):
+        """Encoded /search results for a (non-empty) query"""
+        return self.search_bodies([(query, company)], job_filter)[0]
+
+    def filtered_related_json(self, job_idx, mask):
+        """Encoded related cards of a job, restricted to `mask` when filtering"""
+        if mask is None:
+            return self.related_cards_json(job_idx)
+        return dumps(self.related_cards(job_idx, mask=mask))
+
+    def map_data_body(self, query, company=None, job_filter=None):
+        """Encoded /map_data payload for a (non-empty) query"""
+        mask = self.filter_mask(job_filter)
+        # Check for exact title matches first
+        exact = self.find_exact_matches(query, company, mask)
+        if exact:
+            # Related jobs come from the precomputed neighbour graph
+            return join_object(
+                center=self.center_card_json(exact[0]),
+                related=self.filtered_related_json(exact[0], mask),
+            )
+
+        # If no exact match, use search similarity
+        query_tfidf = self.vectorizer.transform([query])
+        if query_tfidf.sum() == 0:
+            # Fall back to keyword matches for out-of-vocabulary queries
+            hits = self.keyword_index.search(query, 5, mask)
+            top_indices = np.array([idx for idx, _ in hits], dtype=np.int64)
+        else:
+            query_normalized = self.projection.project(query_tfidf)
+
+            top_indices, _ = self.ann_index.search(query_normalized, 5, mask=mask)
+            top_indices = top_indices[0][top_indices[0] >= 0]
+
+        if len(top_indices) == 0:
+            return dumps({"center": None, "related": []})
+
+        center_index = int(top_indices[0])
+
+        # Get related jobs
+        neighbor_ids = self.job_neighbors(center_index)[0]
+        if len(neighbor_ids) and (mask is None or mask[neighbor_ids].any()):
+            related_json = self.filtered_related_json(center_index, mask)
+        else:
+            # Fallback: use next top search results
+            related_json = dumps([
+                self.center_card(int(idx), card_id=i, score=max(0.3, 1.0 - (i * 0.05)))
+                for i, idx in enumerate(top_indices[1:16], 1)
+            ])
+
+        return join_object(center=self.center_card_json(center_index), related=related_json)
+
+    # Skills
+    def skills_body(self, skills, n_jobs=SKILL_JOBS, n_related=SKILL_RELATED):
+        """Encoded /skills payload: jobs ranked by how many of `skills` they list,
+        and the skills most often listed alongside them"""
+        codes, unknown = self.skill_index.resolve(skills)
+        jobs = []
+        for job_idx, overlap in self.skill_index.jobs_for(codes, n_jobs):
+            card = self.related_card(job_idx, overlap / len(codes))
+            card["matched_skills"] = overlap
+            jobs.append(card)
+        return dumps({
+            "skills": [self.skill_index.vocab[code] for code in codes],
+            "unknown": unknown,
+            "jobs": jobs,
+            "related_skills": [
+                {"skill": skill, "cooccurrences": count, "jobs": total}
+                for skill, count, total in self.skill_index.related(codes, n_related)
+            ],
+        })
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+ingest.py - Incremental corpus updates
+When init.json only gains jobs at the end, the new jobs are folded into the
+existing artifacts: projected with the fitted vectorizer/SVD, appended to
+the matrices and ANN index, given neighbour lists, and inserted into the
+lists of existing neighbours they beat. A full refit is only needed once
+drift (see measure_drift) crosses a threshold.
+"""
+import hashlib
+import json
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+FINGERPRINTS_FILE = "job_fingerprints.npy"
+STATE_FILE = "corpus_state.json"
+
+
+def job_fingerprint(job):
+    """64-bit fingerprint of a job over the fields the artifacts are built from"""
+    content = "\0".join((
+        job.get("title", ""),
+        job.get("description", ""),
+        "\0".join(job.get("skills", []) or []),
+    ))
+    digest = hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def save_state(directory, fingerprints, fitted_jobs, folded_jobs):
+    """Record which jobs the artifacts cover and how many were folded in since the last fit"""
+    np.save(directory / FINGERPRINTS_FILE, fingerprints)
+    (directory / STATE_FILE).write_text(json.dumps({"fitted_jobs": fitted_jobs, "folded_jobs": folded_jobs}))
+
+
+def load_state(directory):
+    """(fingerprints, state dict) for the current artifacts, or None"""
+    if not (directory / FINGERPRINTS_FILE).exists() or not (directory / STATE_FILE).exists():
+        return None
+    return np.load(directory / FINGERPRINTS_FILE), json.loads((directory / STATE_FILE).read_text())
+
+
+def appended_from(old_fingerprints, new_fingerprints):
+    """Index of the first appended job if the new corpus only adds jobs at the end, else None"""
+    n = len(old_fingerprints)
+    if len(new_fingerprints) <= n or not np.array_equal(new_fingerprints[:n], old_fingerprints):
+        return None
+    return n
+
+
+def oov_rate(vectorizer, texts):
+    """Share of the new texts' unigram tokens missing from the fitted vocabulary"""
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    total = unknown = 0
+    for text in texts:
+        for token in analyzer(text):
+            if " " in token:
+                continue  # bigrams are mostly new by nature
+            total += 1
+            unknown += token not in vocabulary
+    return unknown / total if total else 0.0
+
+
+def measure_drift(vectorizer, texts, fitted_jobs, folded_jobs):
+    """Drift of the corpus away from the last full fit: the larger of the share of
+    jobs folded in since the fit and the out-of-vocabulary rate of the new texts."""
+    folded_share = (folded_jobs + len(texts)) / max(fitted_jobs, 1)
+    return max(folded_share, oov_rate(vectorizer, texts))
+
+
+def _pad_width(ids, scores, k):
+    if ids.shape[1] >= k:
+        return np.array(ids, dtype=np.int32), np.array(scores, dtype=np.float32)
+    pad = k - ids.shape[1]
+    return (
+        np.pad(np.asarray(ids, dtype=np.int32), ((0, 0), (0, pad)), constant_values=-1),
+        np.pad(np.asarray(scores, dtype=np.float32), ((0, 0), (0, pad))),
+    )
+
+
+def patch_neighbors(neighbor_ids, neighbor_scores, new_ids, candidate_ids, candidate_scores):
+    """Insert new jobs into the neighbour lists of existing jobs they now beat.
+
+    Reverse neighbours are approximated by the new jobs' own neighbour lists:
+    new job j can enter job i's list only if i is among j's neighbours.
+    Rows are modified in place; returns the number of rows changed.
+    """
+    first_new = int(new_ids[0])
+    changed = set()
+    for j, row_ids, row_scores in zip(new_ids, candidate_ids, candidate_scores):
+        for i, score in zip(row_ids, row_scores):
+            if i < 0 or i >= first_new:
+                continue
+            ids, scores = neighbor_ids[i], neighbor_scores[i]
+            if ids[-1] >= 0 and score <= scores[-1]:
+                continue
+            pos = int(np.sum((ids >= 0) & (scores >= score)))
+            ids[pos + 1:] = ids[pos:-1].copy()
+            scores[pos + 1:] = scores[pos:-1].copy()
+            ids[pos], scores[pos] = j, score
+            changed.add(int(i))
+    return len(changed)
+
+
+def fold_in(vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores, ann_index, texts, k):
+    """Append `texts` as new jobs without refitting the vectorizer or SVD.
+
+    Returns the updated (tfidf_matrix, doc_vectors, neighbor_ids, neighbor_scores, ann_index).
+    """
+    n = tfidf_matrix.shape[0]
+    new_tfidf = vectorizer.transform(texts).astype(np.float32)
+    new_vectors = normalize(svd.transform(new_tfidf)).astype(np.float32)
+
+    tfidf_matrix = sparse.vstack([tfidf_matrix, new_tfidf], format="csr")
+    doc_vectors = np.vstack([doc_vectors, new_vectors])
+    ann_index = ann_index.add(new_vectors)
+
+    # Neighbours of the new jobs, against the whole updated corpus
+    new_ids = np.arange(n, n + len(texts))
+    found_ids, found_scores = ann_index.search(new_vectors, k + 1)
+    rows_ids = np.full((len(texts), k), -1, dtype=np.int32)
+    rows_scores = np.zeros((len(texts), k), dtype=np.float32)
+    for row, (ids, scores) in enumerate(zip(found_ids, found_scores)):
+        keep = (ids >= 0) & (ids != new_ids[row])
+        ids, scores = ids[keep][:k], scores[keep][:k]
+        rows_ids[row, :len(ids)] = ids
+        rows_scores[row, :len(ids)] = scores
+
+    neighbor_ids, neighbor_scores = _pad_width(neighbor_ids, neighbor_scores, k)
+    patched = patch_neighbors(neighbor_ids, neighbor_scores, new_ids, rows_ids, rows_scores)
+    print(f"[ingest] folded in {len(texts):,} jobs, patched {patched:,} neighbour lists")
+
+    neighbor_ids = np.vstack([neighbor_ids, rows_ids])
+    neighbor_scores = np.vstack([neighbor_scores, rows_scores])
+    return tfidf_matrix, doc_vectors, neighbor_ids, neighbor_scores, ann_index
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+job_store.py - Columnar storage for job records
+Numeric fields are NumPy arrays, experience_level / growth_potential /
+company are integer codes into per-field category tables, titles and
+descriptions are UTF-8 buffers indexed by offsets, and skills are CSR lists
+of codes into a skill vocabulary. Any other field, or a value of an
+unexpected type, is kept per row as encoded JSON, so records round-trip
+exactly. A saved store is memory-mapped, so workers share its pages.
+"""
+import json
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+NUMERIC_FIELDS = ("salary_min", "salary_max")
+CATEGORICAL_FIELDS = ("experience_level", "growth_potential", "company")
+TEXT_FIELDS = ("title", "description")
+LIST_FIELD = "skills"
+
+# Record key order; bit i of a row's presence mask is set when FIELD_ORDER[i]
+# is stored in its column
+FIELD_ORDER = ("title", "description", "skills", "salary_min", "salary_max",
+               "experience_level", "growth_potential", "company")
+FIELD_BITS = {field: 1 << bit for bit, field in enumerate(FIELD_ORDER)}
+
+MISSING = -1  # category code of a row without the field
+_NOT_FOUND = object()
+META_FILE = "meta.json"
+
+
+def _fits(field, value):
+    """Whether `value` can be stored in the column of `field`"""
+    if field in NUMERIC_FIELDS:
+        return type(value) is int and -2**63 <= value < 2**63
+    if field == LIST_FIELD:
+        return isinstance(value, (list, tuple)) and all(type(v) is str for v in value)
+    return type(value) is str
+
+
+class JobStoreBuilder:
+    """Appends jobs one at a time into compact growable columns"""
+
+    def __init__(self):
+        self.present = array("H")
+        self.numeric = {field: array("q") for field in NUMERIC_FIELDS}
+        self.codes = {field: array("i") for field in CATEGORICAL_FIELDS}
+        self.categories = {field: {} for field in CATEGORICAL_FIELDS}
+        self.text = {field: (bytearray(), array("q", [0])) for field in TEXT_FIELDS + ("extras",)}
+        self.skill_vocab = {}
+        self.skill_ids = array("i")
+        self.skill_offsets = array("q", [0])
+
+    def __len__(self):
+        return len(self.present)
+
+    def append(self, job):
+        mask = 0
+        extras = {key: value for key, value in job.items() if key not in FIELD_BITS}
+        for field in FIELD_ORDER:
+            if field not in job:
+                continue
+            if _fits(field, job[field]):
+                mask |= FIELD_BITS[field]
+            else:
+                extras[field] = job[field]
+        self.present.append(mask)
+
+        for field in NUMERIC_FIELDS:
+            value = job.get(field)
+            # Unset and non-numeric values count as 0, as `job.get(field, 0) or 0` did
+            numeric = type(value) is int or (type(value) is float and abs(value) < 2**63)
+            self.numeric[field].append(int(value) if numeric else 0)
+        for field in CATEGORICAL_FIELDS:
+            if mask & FIELD_BITS[field]:
+                table = self.categories[field]
+                self.codes[field].append(table.setdefault(job[field], len(table)))
+            else:
+                self.codes[field].append(MISSING)
+        for field in TEXT_FIELDS:
+            self._append_text(field, job[field] if mask & FIELD_BITS[field] else "")
+        if mask & FIELD_BITS[LIST_FIELD]:
+            self.skill_ids.extend(self.skill_vocab.setdefault(s, len(self.skill_vocab)) for s in job[LIST_FIELD])
+        self.skill_offsets.append(len(self.skill_ids))
+        self._append_text("extras", json.dumps(extras) if extras else "")
+
+    def _append_text(self, field, text):
+        buffer, offsets = self.text[field]
+        buffer.extend(text.encode("utf-8"))
+        offsets.append(len(buffer))
+
+    def build(self):
+        def frozen(values, dtype):
+            column = np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+            column.flags.writeable = False
+            return column
+
+        return JobStore(
+            present=frozen(self.present, np.uint16),
+            numeric={field: frozen(values, np.int64) for field, values in self.numeric.items()},
+            codes={field: frozen(values, np.int32) for field, values in self.codes.items()},
+            categories={field: tuple(table) for field, table in self.categories.items()},
+            text={
+                field: (frozen(bytes(buffer), np.uint8), frozen(offsets, np.int64))
+                for field, (buffer, offsets) in self.text.items()
+            },
+            skill_vocab=tuple(self.skill_vocab),
+            skill_ids=frozen(self.skill_ids, np.int32),
+            skill_offsets=frozen(self.skill_offsets, np.int64),
+        )
+
+
+class JobRow:
+    """Read-only view of one job; get() behaves like dict.get on the original record"""
+
+    __slots__ = ("store", "idx")
+
+    def __init__(self, store, idx):
+        self.store = store
+        self.idx = idx
+
+    def get(self, field, default=None):
+        return self.store.get(self.idx, field, default)
+
+    def __getitem__(self, field):
+        value = self.store.get(self.idx, field, _NOT_FOUND)
+        if value is _NOT_FOUND:
+            raise KeyError(field)
+        return value
+
+
+class JobStore:
+    """Columnar, read-only job records addressed by job index"""
+
+    def __init__(self, present, numeric, codes, categories, text, skill_vocab, skill_ids, skill_offsets):
+        self.present = present
+        self.numeric = numeric
+        self.codes = codes
+        self.categories = categories
+        self.text = text
+        self.skill_vocab = skill_vocab
+        self.skill_ids = skill_ids
+        self.skill_offsets = skill_offsets
+
+    def __len__(self):
+        return len(self.present)
+
+    def __getitem__(self, idx):
+        return JobRow(self, idx)
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self, start=0, stop=None):
+        """JobRow views of jobs [start, stop)"""
+        for idx in range(start, len(self) if stop is None else stop):
+            yield JobRow(self, idx)
+
+    # Columns
+    @property
+    def salary_min(self):
+        return self.numeric["salary_min"]
+
+    @property
+    def salary_max(self):
+        return self.numeric["salary_max"]
+
+    # Row access
+    def _text(self, field, idx):
+        buffer, offsets = self.text[field]
+        return buffer[offsets[idx]:offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def _extras(self, idx):
+        encoded = self._text("extras", idx)
+        return json.loads(encoded) if encoded else {}
+
+    def skills(self, idx):
+        ids = self.skill_ids[self.skill_offsets[idx]:self.skill_offsets[idx + 1]]
+        return tuple(self.skill_vocab[i] for i in ids)
+
+    def _column_value(self, field, idx):
+        if field in TEXT_FIELDS:
+            return self._text(field, idx)
+        if field in NUMERIC_FIELDS:
+            return int(self.numeric[field][idx])
+        if field in CATEGORICAL_FIELDS:
+            return self.categories[field][self.codes[field][idx]]
+        return self.skills(idx)
+
+    def get(self, idx, field, default=None):
+        """Value of `field` for job `idx`, like dict.get on its record"""
+        bit = FIELD_BITS.get(field)
+        if bit is not None and self.present[idx] & bit:
+            return self._column_value(field, idx)
+        return self._extras(idx).get(field, default)
+
+    def record(self, idx):
+        """The job as a dict, with the keys it was loaded with"""
+        mask = self.present[idx]
+        record = {field: self._column_value(field, idx) for field in FIELD_ORDER if mask & FIELD_BITS[field]}
+        record.update(self._extras(idx))
+        return record
+
+    # Persistence
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {"present": self.present, "skill_ids": self.skill_ids, "skill_offsets": self.skill_offsets}
+        arrays.update({f"numeric_{field}": column for field, column in self.numeric.items()})
+        arrays.update({f"codes_{field}": column for field, column in self.codes.items()})
+        for field, (buffer, offsets) in self.text.items():
+            arrays[f"text_{field}"] = buffer
+            arrays[f"offsets_{field}"] = offsets
+        for name, column in arrays.items():
+            np.save(directory / f"{name}.npy", column)
+        (directory / META_FILE).write_text(json.dumps({
+            "jobs": len(self),
+            "categories": self.categories,
+            "skill_vocab": self.skill_vocab,
+        }))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        meta = json.loads((directory / META_FILE).read_text())
+
+        def column(name):
+            return np.load(directory / f"{name}.npy", mmap_mode=mmap_mode)
+
+        return cls(
+            present=column("present"),
+            numeric={field: column(f"numeric_{field}") for field in NUMERIC_FIELDS},
+            codes={field: column(f"codes_{field}") for field in CATEGORICAL_FIELDS},
+            categories={field: tuple(meta["categories"][field]) for field in CATEGORICAL_FIELDS},
+            text={
+                field: (column(f"text_{field}"), column(f"offsets_{field}"))
+                for field in TEXT_FIELDS + ("extras",)
+            },
+            skill_vocab=tuple(meta["skill_vocab"]),
+            skill_ids=column("skill_ids"),
+            skill_offsets=column("skill_offsets"),
+        )
+
+    def stats(self):
+        arrays = [self.present, self.skill_ids, self.skill_offsets, *self.numeric.values(), *self.codes.values()]
+        arrays += [a for pair in self.text.values() for a in pair]
+        return {
+            "jobs": len(self),
+            "column_bytes": int(sum(a.nbytes for a in arrays)),
+            "categories": {field: len(table) for field, table in self.categories.items()},
+            "skills": len(self.skill_vocab),
+        }
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+jsonstream.py - Incremental readers for job files
+Yields one job at a time from a JSON array (init.json) or JSON Lines file
+(init.jsonl), holding only a read buffer instead of the whole file and its
+fully parsed list at once.
+"""
+import json
+
+CHUNK_CHARS = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(fh, chunk_chars=CHUNK_CHARS):
+    """Yield the elements of the top-level JSON array in text file `fh`"""
+    buffer = fh.read(chunk_chars).lstrip(_WHITESPACE)
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    eof = False
+    expect_value = True
+    after_comma = False
+    while True:
+        # Skip separators, refilling the buffer when it runs dry
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = fh.read(chunk_chars), 0
+            eof = not buffer
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            if expect_value and after_comma:
+                raise ValueError("Trailing ',' in JSON array")
+            return
+        if not expect_value:
+            if buffer[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {buffer[pos]!r}")
+            pos += 1
+            expect_value = after_comma = True
+            continue
+
+        try:
+            value, end = _decoder.raw_decode(buffer, pos)
+            # A value is complete once a separator follows it; a number cut by
+            # the buffer edge ("12" of "12.5") decodes but is not followed by one
+            after = end
+            while after < len(buffer) and buffer[after] in _WHITESPACE:
+                after += 1
+            complete = eof or (after < len(buffer) and buffer[after] in ",]")
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            more = fh.read(chunk_chars)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield value
+        pos = end
+        expect_value = False
+        if pos > chunk_chars:
+            buffer, pos = buffer[pos:], 0
+
+
+def iter_json_lines(fh):
+    """Yield one value per non-blank line of text file `fh`"""
+    for line in fh:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_jobs(path):
+    """Yield job dicts from a .json array or .jsonl file"""
+    with open(path, "r", encoding="utf-8") as fh:
+        if str(path).endswith(".jsonl"):
+            yield from iter_json_lines(fh)
+        else:
+            yield from iter_json_array(fh)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+keyword_index.py - Inverted index for the keyword fallback search
+Character trigram posting lists over job titles and skills, and token posting
+lists over titles, skills and descriptions. Serves substring, prefix and
+typo-tolerant matches by reading only the posting lists of the query's grams
+and tokens instead of scanning every job; descriptions, by far the longest
+field, match on whole tokens only.
+
+Trigrams are keyed by an int64 packing their three code points, tokens by
+their UTF-8 bytes (concatenated, with offsets, in byte order). Posting lists
+are built in one argsort over (key, job) pairs and saved as .npy files that
+are memory-mapped at load, so a query pages in just the lists it reads.
+"""
+import bisect
+import itertools
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from utils.text import normalize_text
+from utils.topk import top_k_with_scores
+
+# Field bits stored alongside each posting, and their ranking weights;
+# scores are divided by the largest weight so they lie in [0, 1]
+TITLE, SKILLS, DESCRIPTION = 4, 2, 1
+FIELD_WEIGHTS = {TITLE: 3.0, SKILLS: 2.0, DESCRIPTION: 1.0}
+MAX_WEIGHT = max(FIELD_WEIGHTS.values())
+GRAM_FIELDS = (TITLE, SKILLS)
+
+GRAM_SIZE = 3
+CODE_POINT_BITS = 21
+MIN_COVERAGE = 0.6  # share of query trigrams (or description tokens) a job must contain to match
+TOKEN_RE = re.compile(r"\w+")
+
+FILES = ("gram_keys", "gram_offsets", "gram_postings", "gram_fields",
+         "token_bytes", "token_bytes_offsets", "token_offsets", "token_postings", "token_fields", "n_jobs")
+
+
+def gram_codes(text):
+    """int64 codes of the overlapping character trigrams of normalized text"""
+    points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    if len(points) < GRAM_SIZE:
+        return np.zeros(0, dtype=np.int64)
+    return points[:-2] << 2 * CODE_POINT_BITS | points[1:-1] << CODE_POINT_BITS | points[2:]
+
+
+def job_fields(job):
+    """(field bit, [normalized texts]) pairs indexed for a job"""
+    return (
+        (TITLE, [normalize_text(job.get("title", ""))]),
+        (SKILLS, [normalize_text(skill) for skill in job.get("skills", []) or []]),
+        (DESCRIPTION, [normalize_text(job.get("description", ""))]),
+    )
+
+
+def _expand(texts, counts):
+    """Per-entry (job ids, field bits) arrays from per-text (job id, bit) pairs
+    and entry counts"""
+    pairs = np.array(texts, dtype=np.int64).reshape(-1, 2)
+    return np.repeat(pairs[:, 0], counts).astype(np.int32), np.repeat(pairs[:, 1], counts).astype(np.uint8)
+
+
+class _PostingLists:
+    """CSR posting lists of (job id, field bits), one per key slot"""
+
+    def __init__(self, offsets, postings, fields):
+        self.offsets = offsets
+        self.postings = postings
+        self.fields = fields
+
+    @classmethod
+    def build(cls, key_ids, job_ids, bits, n_keys):
+        """Posting lists from parallel (key slot, job id, field bit) arrays; a
+        job's bits under one key are OR-ed into a single posting"""
+        pairs = key_ids.astype(np.int64) << 32 | job_ids.astype(np.int64)
+        order = np.argsort(pairs, kind="stable")
+        pairs, bits = pairs[order], bits[order]
+        starts = np.flatnonzero(np.r_[True, pairs[1:] != pairs[:-1]])[:len(pairs)]
+        fields = np.bitwise_or.reduceat(bits, starts)
+        pairs = pairs[starts]
+        offsets = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs >> 32, minlength=n_keys), out=offsets[1:])
+        return cls(offsets, (pairs & 0xFFFFFFFF).astype(np.int32), fields.astype(np.uint8))
+
+    def slots(self, start, stop):
+        span = slice(self.offsets[start], self.offsets[stop])
+        return self.postings[span], self.fields[span]
+
+    def gather(self, slots):
+        """Concatenated postings and fields of `slots`"""
+        parts = [self.slots(slot, slot + 1) for slot in slots]
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8)
+        return np.concatenate([p for p, _ in parts]), np.concatenate([f for _, f in parts])
+
+
+class _TokenKeys:
+    """Sorted token byte strings stored back to back; a sequence for bisect"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, slot):
+        return self.data[self.offsets[slot]:self.offsets[slot + 1]].tobytes()
+
+    def lookup(self, token):
+        """Slot of `token`, or -1"""
+        key = token.encode()
+        pos = bisect.bisect_left(self, key)
+        return pos if pos < len(self) and self[pos] == key else -1
+
+    def prefix_range(self, prefix):
+        """Slots [start, stop) of every token starting with `prefix`"""
+        key = prefix.encode()
+        return bisect.bisect_left(self, key), bisect.bisect_left(self, key + b"\xff")
+
+
+class KeywordIndex:
+    """Trigram + token inverted index with field-weighted ranking"""
+
+    def __init__(self, gram_keys, grams, token_keys, tokens, n_jobs):
+        self.gram_keys = gram_keys
+        self.grams = grams
+        self.token_keys = token_keys
+        self.tokens = tokens
+        self.n_jobs = n_jobs
+
+    @classmethod
+    def build(cls, jobs):
+        # Per indexed text: (job id, field bit) and how many grams / tokens it adds
+        gram_parts, gram_texts, gram_counts = [np.zeros(0, dtype=np.int64)], [], []
+        vocabulary = defaultdict(itertools.count().__next__)
+        token_ids, token_texts, token_counts = [], [], []
+        n_jobs = 0
+        for job_id, job in enumerate(jobs):
+            n_jobs += 1
+            for bit, texts in job_fields(job):
+                for text in texts:
+                    if bit in GRAM_FIELDS:
+                        codes = gram_codes(text)
+                        gram_parts.append(codes)
+                        gram_texts.append((job_id, bit))
+                        gram_counts.append(len(codes))
+                    ids = [vocabulary[token] for token in set(TOKEN_RE.findall(text))]
+                    token_ids.extend(ids)
+                    token_texts.append((job_id, bit))
+                    token_counts.append(len(ids))
+
+        gram_keys, gram_slots = np.unique(np.concatenate(gram_parts), return_inverse=True)
+        grams = _PostingLists.build(gram_slots.ravel(), *_expand(gram_texts, gram_counts), len(gram_keys))
+
+        # Renumber tokens in byte order, so prefixes are contiguous slot ranges
+        encoded = [token.encode() for token in vocabulary]
+        order = sorted(range(len(encoded)), key=encoded.__getitem__)
+        slot_of = np.empty(len(order), dtype=np.int64)
+        slot_of[order] = np.arange(len(order))
+        lengths = np.array([len(encoded[i]) for i in order], dtype=np.int64)
+        token_keys = _TokenKeys(
+            np.frombuffer(b"".join(encoded[i] for i in order), dtype=np.uint8),
+            np.r_[0, np.cumsum(lengths)].astype(np.int64),
+        )
+        tokens = _PostingLists.build(
+            slot_of[np.array(token_ids, dtype=np.int64)], *_expand(token_texts, token_counts), len(token_keys)
+        )
+        return cls(gram_keys, grams, token_keys, tokens, n_jobs)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = (
+            self.gram_keys, self.grams.offsets, self.grams.postings, self.grams.fields,
+            self.token_keys.data, self.token_keys.offsets,
+            self.tokens.offsets, self.tokens.postings, self.tokens.fields, np.array(self.n_jobs),
+        )
+        for name, array in zip(FILES, arrays):
+            np.save(directory / f"{name}.npy", array)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        arrays = dict(zip(FILES, (np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in FILES)))
+        return cls(
+            arrays["gram_keys"],
+            _PostingLists(arrays["gram_offsets"], arrays["gram_postings"], arrays["gram_fields"]),
+            _TokenKeys(arrays["token_bytes"], arrays["token_bytes_offsets"]),
+            _PostingLists(arrays["token_offsets"], arrays["token_postings"], arrays["token_fields"]),
+            int(arrays["n_jobs"]),
+        )
+
+    def search(self, query, k=5, mask=None):
+        """Return [(job_id, score)] for the k best keyword matches, best first,
+        with scores in [0, 1] like the similarity scores of the other search paths.
+
+        Queries of at least three characters match titles and skills on trigram
+        coverage (exact substrings score highest, near-misses above MIN_COVERAGE
+        still match) and descriptions on the share of query tokens they contain;
+        shorter queries match as a token prefix. With a boolean job `mask`, only
+        jobs where it is set are returned.
+        """
+        query = normalize_text(query)
+        if not query:
+            return []
+        if len(query) < GRAM_SIZE:
+            return self._prefix_search(query, k, mask)
+
+        grams = np.unique(gram_codes(query))
+        slots = np.searchsorted(self.gram_keys, grams)
+        found = slots < len(self.gram_keys)
+        found[found] = self.gram_keys[slots[found]] == grams[found]
+        gram_postings, gram_fields = self.grams.gather(slots[found].tolist())
+
+        words = set(TOKEN_RE.findall(query))
+        token_slots = [slot for slot in map(self.token_keys.lookup, words) if slot >= 0]
+        token_postings, token_fields = self.tokens.gather(token_slots)
+        token_postings = token_postings[(token_fields & DESCRIPTION) != 0]
+
+        job_ids, inverse = np.unique(np.concatenate([gram_postings, token_postings]), return_inverse=True)
+        if not len(job_ids):
+            return []
+        gram_inverse, token_inverse = inverse[:len(gram_postings)], inverse[len(gram_postings):]
+        coverage = np.bincount(gram_inverse, minlength=len(job_ids)) / len(grams)
+        token_coverage = np.bincount(token_inverse, minlength=len(job_ids)) / max(len(words), 1)
+        scores = FIELD_WEIGHTS[DESCRIPTION] * token_coverage ** 2
+        for bit in GRAM_FIELDS:
+            in_field = (gram_fields & bit) != 0
+            field_coverage = np.bincount(gram_inverse[in_field], minlength=len(job_ids)) / len(grams)
+            scores = np.maximum(scores, FIELD_WEIGHTS[bit] * field_coverage ** 2)
+
+        keep = (coverage >= MIN_COVERAGE) | (token_coverage >= MIN_COVERAGE)
+        return self._ranked(job_ids[keep], scores[keep], k, mask)
+
+    def _prefix_search(self, prefix, k, mask=None):
+        start, stop = self.token_keys.prefix_range(prefix)
+        if start == stop:
+            return []
+        postings, fields = self.tokens.slots(start, stop)
+        weights = np.zeros(len(fields))
+        for bit, weight in FIELD_WEIGHTS.items():
+            weights = np.where((fields & bit) != 0, np.maximum(weights, weight), weights)
+        job_ids, inverse = np.unique(postings, return_inverse=True)
+        scores = np.zeros(len(job_ids))
+        np.maximum.at(scores, inverse, weights)
+        return self._ranked(job_ids, scores, k, mask)
+
+    @staticmethod
+    def _ranked(job_ids, scores, k, mask=None):
+        if mask is not None:
+            keep = mask[job_ids]
+            job_ids, scores = job_ids[keep], scores[keep]
+        best, best_scores = top_k_with_scores(scores / MAX_WEIGHT, k)
+        return [(int(job_ids[i]), float(s)) for i, s in zip(best, best_scores)]
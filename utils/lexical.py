@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+lexical.py - Term-at-a-time TF-IDF scoring over term-major posting lists
+The corpus TF-IDF matrix is stored L2-normalized in CSC form: column t holds
+the (job id, weight) postings of term t. Query rows are L2-normalized by the
+vectorizer too, so cosine similarity is a plain dot product, accumulated over
+the posting lists of the query's terms only. Scoring cost follows the
+lengths of those lists, not the size of the corpus.
+
+Queries touching many postings (head terms like "manager") use dynamic
+pruning instead (block-max MaxScore). Every posting list's maximum weight,
+and for long lists the maximum within each range of BLOCK_DOCS job ids, is
+precomputed at build time. Once the lists not merged yet cannot lift an
+unseen job into the top k, they are only probed for the jobs already found,
+and jobs whose block-max bound falls below the current k-th score are
+dropped first. The top-k is the same as exhaustive scoring.
+"""
+import os
+
+import numpy as np
+from scipy.sparse import csc_matrix
+from sklearn.preprocessing import normalize
+
+from utils.topk import top_k_with_scores
+
+WEIGHT_DTYPE = np.float32
+
+# Block-max layout: job ids per block, and posting lists at least this long
+# get per-block maxima (shorter lists are cheap enough to score exactly)
+BLOCK_DOCS = 1024
+LONG_POSTINGS = 1024
+
+# Queries with fewer postings than this are scored exhaustively
+PRUNE_MIN_POSTINGS = int(os.environ.get("SCOUT_PRUNE_MIN_POSTINGS", "8192"))
+
+# Relative slack on upper bounds, covering float32 rounding of the scores
+BOUND_SLACK = 1e-5
+
+
+def corpus_matrix(tfidf_matrix):
+    """The corpus matrix in its stored form: L2-normalized rows, float32, CSC
+    with job ids sorted within each term's column"""
+    matrix = csc_matrix(normalize(tfidf_matrix, norm="l2", axis=1), dtype=WEIGHT_DTYPE)
+    matrix.sort_indices()
+    return matrix
+
+
+class BlockMaxima:
+    """Maximum weight of every posting list, and per-block maxima of the long ones.
+
+    `term_max[t]` is the largest weight in term t's list. For long term
+    `terms[i]`, entries offsets[i]:offsets[i + 1] give the blocks of job ids it
+    has postings in (ascending `blocks`) and its largest weight in each.
+    """
+
+    def __init__(self, block_docs, term_max, terms, offsets, blocks, maxima):
+        self.block_docs = int(block_docs)
+        self.term_max = term_max
+        self.terms = terms
+        self.offsets = offsets
+        self.blocks = blocks
+        self.maxima = maxima
+        self._slot = {int(term): slot for slot, term in enumerate(terms)}
+
+    @classmethod
+    def build(cls, matrix, block_docs=BLOCK_DOCS, long_postings=LONG_POSTINGS):
+        """Maxima of the posting lists of `matrix` (see corpus_matrix); block
+        maxima for lists with at least `long_postings` entries"""
+        lengths = np.diff(matrix.indptr)
+        term_max = np.zeros(matrix.shape[1], dtype=WEIGHT_DTYPE)
+        nonempty = lengths > 0
+        if matrix.nnz:
+            term_max[nonempty] = np.maximum.reduceat(matrix.data, matrix.indptr[:-1][nonempty])
+
+        terms = np.flatnonzero(lengths >= long_postings).astype(np.int32)
+        positions = np.concatenate(
+            [np.arange(matrix.indptr[t], matrix.indptr[t + 1]) for t in terms] or [np.empty(0, dtype=np.int64)]
+        )
+        slots = np.repeat(np.arange(len(terms)), lengths[terms])
+        blocks = matrix.indices[positions] // block_docs
+
+        # Job ids are sorted within a list, so each (term, block) pair is one run
+        new_run = np.ones(len(positions), dtype=bool)
+        new_run[1:] = (slots[1:] != slots[:-1]) | (blocks[1:] != blocks[:-1])
+        run_starts = np.flatnonzero(new_run)
+        if len(run_starts):
+            maxima = np.maximum.reduceat(matrix.data[positions], run_starts).astype(WEIGHT_DTYPE)
+        else:
+            maxima = np.empty(0, dtype=WEIGHT_DTYPE)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(slots[run_starts], minlength=len(terms)), out=offsets[1:])
+        return cls(block_docs, term_max, terms, offsets, blocks[run_starts].astype(np.int32), maxima)
+
+    def save(self, path):
+        np.savez(
+            path, block_docs=self.block_docs, term_max=self.term_max, terms=self.terms,
+            offsets=self.offsets, blocks=self.blocks, maxima=self.maxima,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def bounds(self, term, job_ids):
+        """Upper bound of term's weight for each of `job_ids`: its block maximum
+        for a long list, its list maximum otherwise"""
+        slot = self._slot.get(int(term), -1)
+        if slot < 0:
+            return np.full(len(job_ids), self.term_max[term], dtype=WEIGHT_DTYPE)
+        entries = slice(self.offsets[slot], self.offsets[slot + 1])
+        term_blocks = self.blocks[entries]
+        job_blocks = job_ids // self.block_docs
+        at = np.minimum(np.searchsorted(term_blocks, job_blocks), len(term_blocks) - 1)
+        return np.where(term_blocks[at] == job_blocks, self.maxima[entries][at], 0).astype(WEIGHT_DTYPE)
+
+
+class LexicalIndex:
+    """Posting lists of an L2-normalized, term-major corpus TF-IDF matrix"""
+
+    def __init__(self, matrix, block_maxima=None):
+        self.matrix = matrix
+        self.n_jobs, self.n_terms = matrix.shape
+        self.offsets = matrix.indptr
+        self.job_ids = matrix.indices
+        self.weights = matrix.data
+        self.block_maxima = block_maxima
+
+    def __len__(self):
+        return self.n_jobs
+
+    def postings(self, term):
+        """(job ids, weights) of one term"""
+        span = slice(self.offsets[term], self.offsets[term + 1])
+        return self.job_ids[span], self.weights[span]
+
+    def score(self, terms, query_weights, mask=None):
+        """(job ids, cosine scores) of every job sharing a term with the query.
+
+        Term-at-a-time: each term's postings are scaled by the query weight and
+        summed per job. Jobs outside a boolean `mask` are dropped.
+        """
+        if len(terms) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=WEIGHT_DTYPE)
+        parts = [self.postings(term) for term in terms]
+        return _accumulate(
+            [job_ids for job_ids, _ in parts],
+            [weights * np.float32(w) for (_, weights), w in zip(parts, query_weights)],
+            mask,
+        )
+
+    def _fillers(self, exclude, count, mask):
+        """The first `count` jobs (by id) outside `exclude` and inside `mask`: the
+        zero-score candidates a dense ranking would also have to take"""
+        pool = np.arange(min(self.n_jobs, count + len(exclude))) if mask is None else np.flatnonzero(mask)
+        return pool[~np.isin(pool, exclude)][:count]
+
+    def top_candidates(self, query_tfidf, k, mask=None):
+        """(ids, scores), each (queries, k), of the k best jobs per TF-IDF query row.
+
+        When fewer than k jobs share a term with a query, the remaining slots
+        take zero-score jobs; slots that cannot be filled at all (a mask
+        allowing fewer than k jobs) hold id -1 and score -inf.
+        """
+        query_tfidf = query_tfidf.tocsr()
+        n_queries = query_tfidf.shape[0]
+        k = min(k, self.n_jobs)
+        ids = np.full((n_queries, k), -1, dtype=np.int64)
+        scores = np.full((n_queries, k), -np.inf, dtype=WEIGHT_DTYPE)
+        for row in range(n_queries):
+            span = slice(query_tfidf.indptr[row], query_tfidf.indptr[row + 1])
+            terms, query_weights = query_tfidf.indices[span], query_tfidf.data[span]
+            if self._prunable(terms):
+                touched, best_ids, best_scores = self.top_k_pruned(terms, query_weights, k, mask)
+            else:
+                touched, touched_scores = self.score(terms, query_weights, mask)
+                best, best_scores = top_k_with_scores(touched_scores, k)
+                best_ids = touched[best]
+            found = len(best_ids)
+            ids[row, :found] = best_ids
+            scores[row, :found] = best_scores
+            if found < k:
+                fillers = self._fillers(touched, k - found, mask)
+                ids[row, found:found + len(fillers)] = fillers
+                scores[row, found:found + len(fillers)] = 0
+        return ids, scores
+
+    def _prunable(self, terms):
+        if self.block_maxima is None or len(terms) == 0:
+            return False
+        return int((self.offsets[terms + 1] - self.offsets[terms]).sum()) >= PRUNE_MIN_POSTINGS
+
+    def top_k_pruned(self, terms, query_weights, k, mask=None):
+        """(candidate job ids, top-k ids, top-k scores) by block-max MaxScore.
+
+        Lists are merged in descending order of their maximum contribution.
+        Once the lists left cannot lift a job not seen yet past the current k-th
+        score, they are only probed for the jobs already seen, after dropping
+        those whose block-max bound falls short. The top-k equals that of
+        score(); candidates include every job sharing a term with the query
+        whenever fewer than k jobs do.
+        """
+        bm = self.block_maxima
+        impact = query_weights.astype(np.float64) * bm.term_max[terms]
+        order = np.argsort(-impact, kind="stable")
+        terms, query_weights = terms[order], query_weights[order]
+        # remaining[i]: the most lists i.. can add to any job's score
+        remaining = np.append(np.cumsum(impact[order][::-1])[::-1], 0.0) * (1 + BOUND_SLACK)
+
+        ids = np.empty(0, dtype=np.int32)
+        partial = np.empty(0, dtype=np.float64)
+        threshold = 0.0
+        for i, (term, weight) in enumerate(zip(terms, query_weights)):
+            job_ids, weights = self.postings(term)
+            contributions = weights * np.float32(weight)
+            if len(ids) < k or remaining[i] >= threshold:
+                # A job not seen yet could still reach the top k: merge the whole list
+                ids, partial = _accumulate([ids, job_ids], [partial, contributions], mask, dtype=np.float64)
+            else:
+                bound = partial.copy()
+                for later, later_weight in zip(terms[i:], query_weights[i:]):
+                    bound += float(later_weight) * bm.bounds(later, ids)
+                keep = bound * (1 + BOUND_SLACK) >= threshold
+                ids, partial = ids[keep], partial[keep]
+                at = np.minimum(np.searchsorted(job_ids, ids), len(job_ids) - 1)
+                hit = job_ids[at] == ids
+                partial[hit] += contributions[at[hit]]
+            if len(ids) >= k:
+                threshold = float(np.partition(partial, len(partial) - k)[len(partial) - k])
+
+        best, best_scores = top_k_with_scores(partial.astype(WEIGHT_DTYPE), k)
+        return ids, ids[best], best_scores
+
+    def stats(self):
+        lengths = np.diff(self.offsets)
+        return {
+            "terms": int(self.n_terms),
+            "postings": int(len(self.job_ids)),
+            "max_posting_list": int(lengths.max()) if lengths.size else 0,
+            "block_max_terms": 0 if self.block_maxima is None else int(len(self.block_maxima.terms)),
+        }
+
+
+def _accumulate(id_parts, score_parts, mask=None, dtype=WEIGHT_DTYPE):
+    """(sorted job ids, summed scores) over concatenated postings; jobs outside
+    a boolean `mask` are dropped"""
+    if not id_parts:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=dtype)
+    ids = np.concatenate(id_parts)
+    contributions = np.concatenate(score_parts)
+    touched, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions, minlength=len(touched)).astype(dtype)
+    if mask is not None:
+        keep = mask[touched]
+        touched, scores = touched[keep], scores[keep]
+    return touched, scores
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+precompute.py - Offline build of the Scout search index
+Builds TF-IDF / SVD models, the ANN index, the neighbour graph, the
+keyword index and the skill index for init.json into a new versioned directory under
+precomputed/versions/, then publishes it by atomically repointing
+precomputed/CURRENT. Builds hold precomputed/build.lock, so concurrent
+builders queue instead of clobbering each other, and serving processes only
+ever see complete versions.
+Usage: python -m utils.precompute [--root .] [--full] [--keep 3]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from utils import artifacts, ingest
+from utils.job_store import JobStoreBuilder
+from utils.jsonstream import iter_jobs
+from utils.ann import BruteForceIndex, IVFIndex, build_index, graph_recall, recall_at_k
+from utils.keyword_index import KeywordIndex
+from utils.projection import PROJECTION_DENSITY, PROJECTION_LAYOUT, QueryProjection, fidelity
+from utils.quantize import recall_report, save_report
+from utils.skill_index import SkillIndex
+from utils.vocabulary import make_vectorizer, vocabulary_layout
+from utils.timing import PhaseTimer
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# Index config
+SVD_COMPONENTS = 100
+NEIGHBORS_PER_JOB = 15
+
+# Artifact layout: "fast" (mmap-able .npy in query dtype) or "compressed"
+ARTIFACT_FORMAT = os.environ.get("SCOUT_ARTIFACT_FORMAT", "fast")
+
+# ANN engine: "ivf" (approximate) or "brute" (exact, for validation);
+# nprobe trades recall for latency
+ANN_ENGINE = os.environ.get("SCOUT_ANN_ENGINE", "ivf")
+ANN_NPROBE = int(os.environ.get("SCOUT_ANN_NPROBE", "8"))
+ANN_RECALL_SAMPLE = 256
+
+# Score ANN queries from the int8 doc-vector codes (re-ranked in float32)
+# instead of the float32 vectors
+ANN_QUANTIZED = os.environ.get("SCOUT_ANN_QUANTIZED", "1") == "1"
+
+# Threads used for the neighbour graph (default: all cores)
+BUILD_WORKERS = int(os.environ.get("SCOUT_BUILD_WORKERS", "0")) or os.cpu_count()
+
+# Incremental ingest: fold appended jobs into existing artifacts until drift
+# (share of jobs added since the last fit, or new-vocabulary rate) crosses the threshold
+INCREMENTAL_INGEST = os.environ.get("SCOUT_INCREMENTAL_INGEST", "1") == "1"
+INCREMENTAL_MAX_DRIFT = float(os.environ.get("SCOUT_INCREMENTAL_MAX_DRIFT", "0.25"))
+
+# Published versions kept on disk (the current one is never removed)
+KEEP_VERSIONS = int(os.environ.get("SCOUT_KEEP_VERSIONS", "3"))
+
+# Layout of precomputed/
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "build.lock"
+DATA_HASH_FILE = "data_hash.txt"
+TMP_PREFIX = ".tmp-"
+
+# Read size for hashing the jobs file
+HASH_CHUNK_BYTES = 1 << 20
+
+# Files inside a version directory besides the artifacts.py layouts and the
+# snapshot of the jobs file (named in the manifest)
+MANIFEST_FILE = "manifest.json"
+JOBS_STORE_DIR = "jobs"
+ANN_FILE = "ann_ivf.npz"
+KEYWORD_INDEX_DIR = "keyword_index"
+SKILL_INDEX_FILE = "skill_index.npz"
+
+
+def scan_jobs(json_file_path):
+    """One streaming pass over a jobs file: (JobStore, fingerprints).
+
+    Jobs go into the columnar store as they are parsed, so the raw file and a
+    list of job dicts are never held alongside it.
+    """
+    builder = JobStoreBuilder()
+    fingerprints = []
+    try:
+        print(f"[load] {json_file_path}")
+        for job in iter_jobs(json_file_path):
+            fingerprints.append(ingest.job_fingerprint(job))
+            builder.append(job)
+        print(f"[load] ✓  {len(builder):,} jobs")
+    except Exception as exc:
+        print(f"[error] loading JSON – {exc}")
+        builder, fingerprints = JobStoreBuilder(), []
+    return builder.build(), np.array(fingerprints, dtype=np.uint64)
+
+
+def source_stat(path):
+    """File metadata that changes whenever the jobs file is rewritten"""
+    stat = Path(path).stat()
+    return {"name": Path(path).name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def copy_and_hash(source, target):
+    """Copy `source` to `target` in one streaming read; blake2b hex digest of its bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        for chunk in iter(lambda: src.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+def corpus_file(root):
+    """The jobs file under `root`: init.jsonl (JSON Lines) if present, else init.json"""
+    jsonl = Path(root) / "init.jsonl"
+    return jsonl if jsonl.exists() else Path(root) / "init.json"
+
+
+def job_text(job):
+    """Text indexed by TF-IDF for a job"""
+    return f"{job.get('title','')} {job.get('description','')} {' '.join(job.get('skills', []))}"
+
+
+# Published versions
+def write_atomic(path, text):
+    """Replace `path` with `text` so readers see either the old or the new content"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def current_version_dir(precompute_dir):
+    """Directory of the published version, or None"""
+    current = Path(precompute_dir) / CURRENT_FILE
+    if not current.exists():
+        return None
+    version_dir = Path(precompute_dir) / VERSIONS_DIR / current.read_text().strip()
+    return version_dir if (version_dir / MANIFEST_FILE).exists() else None
+
+
+def read_manifest(version_dir):
+    return json.loads((version_dir / MANIFEST_FILE).read_text())
+
+
+@contextmanager
+def build_lock(precompute_dir):
+    """Exclusive lock on precomputed/ for the duration of a build; blocks while another build runs"""
+    if fcntl is None:
+        print("[build] file locking unavailable – concurrent builds are not serialized")
+        yield
+        return
+    with open(Path(precompute_dir) / LOCK_FILE, "w") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("[build] another build is running – waiting for it")
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def prune_versions(precompute_dir, keep):
+    """Remove all but the `keep` newest versions, and leftovers of interrupted builds"""
+    versions_dir = Path(precompute_dir) / VERSIONS_DIR
+    current = current_version_dir(precompute_dir)
+    for stale in versions_dir.glob(TMP_PREFIX + "*"):
+        shutil.rmtree(stale, ignore_errors=True)
+    published = sorted(p for p in versions_dir.iterdir() if p.is_dir() and not p.name.startswith("."))
+    for old in published[:max(len(published) - keep, 0)]:
+        if old != current:
+            # Processes still mapping files from `old` keep them until they reload
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def progress_printer(label, step=0.1):
+    """progress(done, total) callback that prints every `step` of the way"""
+    reported = [-1]
+
+    def report(done, total):
+        mark = int(done / total / step)
+        if mark > reported[0]:
+            reported[0] = mark
+            print(f"[{label}] {done / total:4.0%} ({done:,}/{total:,} blocks)")
+    return report
+
+
+# Artifact pipeline: full fit or incremental fold-in
+def build_artifacts(data, target_dir, fingerprints):
+    """Full fit: TF-IDF, SVD, ANN index and neighbour graph for every job"""
+    print("[build] Computing TF-IDF / SVD for jobs...")
+
+    # TF-IDF, fed job texts one at a time (vocabulary strategy: see utils/vocabulary.py)
+    vectorizer = make_vectorizer()
+    tfidf_matrix = vectorizer.fit_transform(job_text(d) for d in data).astype(np.float32)
+
+    # SVD
+    svd = TruncatedSVD(n_components=SVD_COMPONENTS, random_state=42)
+    doc_vectors = svd.fit_transform(tfidf_matrix)
+    doc_vectors = normalize(doc_vectors, axis=1).astype(np.float32)
+
+    # Nearest neighbors for similarity
+    ann_index = build_index(ANN_ENGINE, doc_vectors, nprobe=ANN_NPROBE)
+    knn_start = time.time()
+    neighbor_ids, neighbor_scores = ann_index.knn_graph(
+        NEIGHBORS_PER_JOB, workers=BUILD_WORKERS, progress=progress_printer("knn")
+    )
+    print(f"[knn] ✓  {len(ann_index):,} jobs on {BUILD_WORKERS} threads in {time.time() - knn_start:.2f}s")
+    neighbor_scores = np.where(neighbor_ids >= 0, neighbor_scores, 0)
+
+    if ann_index.kind != "brute" and len(ann_index):
+        # The graph (served as related jobs) and query search probe differently
+        rows = np.arange(min(len(ann_index), ANN_RECALL_SAMPLE))
+        graph = graph_recall(ann_index.vectors, neighbor_ids, rows)
+        search = recall_at_k(ann_index, BruteForceIndex(ann_index.vectors), doc_vectors[rows], NEIGHBORS_PER_JOB)
+        print(f"[ann] {ann_index.stats()} graph recall@{NEIGHBORS_PER_JOB}={graph:.3f} "
+              f"search recall@{NEIGHBORS_PER_JOB}={search:.3f}")
+
+    # Save computed data
+    artifacts.save(
+        target_dir, ARTIFACT_FORMAT, vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores
+    )
+    ann_index.save(target_dir / ANN_FILE)
+    report_vector_codes(target_dir, doc_vectors)
+    report_projection(target_dir, svd, tfidf_matrix)
+    ingest.save_state(target_dir, fingerprints, fitted_jobs=len(data), folded_jobs=0)
+    print("[build] ✓  pre-compute finished")
+    return "full"
+
+
+def update_artifacts_incrementally(data, source_dir, target_dir, fingerprints):
+    """Fold appended jobs into the artifacts of `source_dir`, writing them to `target_dir`.
+
+    Returns None if a full refit is needed.
+    """
+    if not INCREMENTAL_INGEST or source_dir is None:
+        return None
+    manifest = read_manifest(source_dir)
+    if (manifest["format"] != ARTIFACT_FORMAT or manifest["ann_engine"] != ANN_ENGINE
+            or manifest.get("tfidf_layout") != artifacts.TFIDF_LAYOUT
+            or manifest.get("query_projection") != PROJECTION_LAYOUT
+            or manifest.get("vocabulary") != vocabulary_layout()):
+        return None
+    state = ingest.load_state(source_dir)
+    if state is None:
+        return None
+    old_fingerprints, corpus_state = state
+    start = ingest.appended_from(old_fingerprints, fingerprints)
+    if start is None:
+        return None
+
+    vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores = artifacts.load(
+        source_dir, ARTIFACT_FORMAT
+    )
+    if tfidf_matrix.shape[0] != start:
+        return None
+    texts = [job_text(d) for d in data.rows(start)]
+    drift = ingest.measure_drift(vectorizer, texts, corpus_state["fitted_jobs"], corpus_state["folded_jobs"])
+    if drift > INCREMENTAL_MAX_DRIFT:
+        print(f"[ingest] drift {drift:.2f} > {INCREMENTAL_MAX_DRIFT} – full refit")
+        return None
+
+    ann_index = load_ann(source_dir, ANN_ENGINE, doc_vectors)
+    tfidf_matrix, doc_vectors, neighbor_ids, neighbor_scores, ann_index = ingest.fold_in(
+        vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores, ann_index,
+        texts, NEIGHBORS_PER_JOB
+    )
+    artifacts.save(
+        target_dir, ARTIFACT_FORMAT, vectorizer, tfidf_matrix, svd, doc_vectors, neighbor_ids, neighbor_scores
+    )
+    ann_index.save(target_dir / ANN_FILE)
+    report_vector_codes(target_dir, doc_vectors)
+    report_projection(target_dir, svd, tfidf_matrix)
+    ingest.save_state(
+        target_dir, fingerprints,
+        fitted_jobs=corpus_state["fitted_jobs"],
+        folded_jobs=corpus_state["folded_jobs"] + len(texts),
+    )
+    print(f"[ingest] ✓  incremental update (drift {drift:.2f})")
+    return "incremental"
+
+
+def report_vector_codes(target_dir, doc_vectors):
+    """Recall of int8 doc-vector search against float32 search, kept with the version"""
+    if not len(doc_vectors):
+        return
+    codes = artifacts.load_vector_codes(target_dir, ARTIFACT_FORMAT)
+    report = recall_report(doc_vectors, codes, doc_vectors[:ANN_RECALL_SAMPLE], NEIGHBORS_PER_JOB)
+    save_report(target_dir, report)
+    print(f"[int8] {report}")
+
+
+def report_projection(target_dir, svd, tfidf_matrix):
+    """Size of the stored query projection and, when pruned, its fidelity to the
+    dense one on a sample of job rows"""
+    projection = artifacts.load_query_projection(target_dir, ARTIFACT_FORMAT)
+    stats = projection.stats()
+    if PROJECTION_DENSITY < 1:
+        sample = tfidf_matrix.tocsr()[:ANN_RECALL_SAMPLE]
+        stats["mean_cosine"] = round(fidelity(QueryProjection.from_components(svd.components_, 1), projection, sample), 4)
+    print(f"[projection] {stats}")
+
+
+def load_ann(version_dir, engine, doc_vectors, quantized=None):
+    """ANN index of a version; the brute-force engine has nothing on disk"""
+    if engine == "ivf":
+        return IVFIndex.load(version_dir / ANN_FILE, doc_vectors, nprobe=ANN_NPROBE, quantized=quantized)
+    return build_index(engine, doc_vectors, nprobe=ANN_NPROBE, quantized=quantized)
+
+
+def build(root, full=False, keep=KEEP_VERSIONS):
+    """Build and publish a version for root/init.json unless the current one already matches.
+
+    Returns the published version directory.
+    """
+    root = Path(root)
+    precompute_dir = root / "precomputed"
+    versions_dir = precompute_dir / VERSIONS_DIR
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    with build_lock(precompute_dir):
+        prune_versions(precompute_dir, keep)
+        timer = PhaseTimer("build")
+        source = corpus_file(root)
+        current = current_version_dir(precompute_dir)
+        manifest = read_manifest(current) if current is not None and not full else None
+
+        def up_to_date(**expected):
+            return manifest is not None and all(manifest.get(key) == value for key, value in {
+                **expected, "format": ARTIFACT_FORMAT, "ann_engine": ANN_ENGINE, "jobs_store": JOBS_STORE_DIR,
+                "keyword_index": KEYWORD_INDEX_DIR, "skill_index": SKILL_INDEX_FILE,
+                "tfidf_layout": artifacts.TFIDF_LAYOUT, "vector_codes": artifacts.VECTOR_CODES,
+                "query_projection": PROJECTION_LAYOUT, "vocabulary": vocabulary_layout(),
+            }.items())
+
+        # Unchanged file metadata: nothing to read at all
+        if up_to_date(source=source_stat(source)):
+            print(f"[build] ✓  {current.name} is up to date")
+            return current
+
+        # Snapshot the corpus first so the version serves exactly the jobs it was built from
+        tmp_dir = versions_dir / f"{TMP_PREFIX}{os.getpid()}"
+        tmp_dir.mkdir()
+        try:
+            jobs_file = source.name
+            stat = source_stat(source)
+            with timer.phase("hash"):
+                data_hash = copy_and_hash(source, tmp_dir / jobs_file)
+            if up_to_date(data_hash=data_hash):
+                # Rewritten with identical content (e.g. touched): record the new
+                # metadata, so later checks skip the copy and hash again
+                write_atomic(current / MANIFEST_FILE, json.dumps({**manifest, "source": stat}, indent=2))
+                print(f"[build] ✓  {current.name} is up to date (content unchanged)")
+                return current
+
+            with timer.phase("jobs"):
+                data, fingerprints = scan_jobs(tmp_dir / jobs_file)
+            with timer.phase("artifacts"):
+                mode = None if full else update_artifacts_incrementally(data, current, tmp_dir, fingerprints)
+                mode = mode or build_artifacts(data, tmp_dir, fingerprints)
+            with timer.phase("keyword_index"):
+                KeywordIndex.build(data).save(tmp_dir / KEYWORD_INDEX_DIR)
+            with timer.phase("skill_index"):
+                SkillIndex.build(data).save(tmp_dir / SKILL_INDEX_FILE)
+            data.save(tmp_dir / JOBS_STORE_DIR)
+
+            (tmp_dir / MANIFEST_FILE).write_text(json.dumps({
+                "data_hash": data_hash,
+                "source": stat,
+                "jobs": len(data),
+                "jobs_file": jobs_file,
+                "jobs_store": JOBS_STORE_DIR,
+                "keyword_index": KEYWORD_INDEX_DIR,
+                "skill_index": SKILL_INDEX_FILE,
+                "tfidf_layout": artifacts.TFIDF_LAYOUT,
+                "vector_codes": artifacts.VECTOR_CODES,
+                "query_projection": PROJECTION_LAYOUT,
+                "vocabulary": vocabulary_layout(),
+                "format": ARTIFACT_FORMAT,
+                "ann_engine": ANN_ENGINE,
+                "mode": mode,
+                "built_at": time.time(),
+            }, indent=2))
+
+            # Publish: the complete directory appears under its final name in one rename,
+            # then CURRENT and data_hash.txt (watched by serving processes) are repointed
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{data_hash[:8]}"
+            while (versions_dir / name).exists():
+                name += "x"
+            version_dir = versions_dir / name
+            os.rename(tmp_dir, version_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        write_atomic(precompute_dir / CURRENT_FILE, name)
+        write_atomic(precompute_dir / DATA_HASH_FILE, data_hash)
+        prune_versions(precompute_dir, keep)
+        print(f"[build] ✓  published {name} ({mode}, {len(data):,} jobs)")
+        timer.report()
+        return version_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--root", type=Path, default=Path(__file__).resolve().parent.parent,
+                        help="directory containing init.json and precomputed/")
+    parser.add_argument("--full", action="store_true", help="refit from scratch instead of folding in appended jobs")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="published versions to keep")
+    args = parser.parse_args()
+    build(args.root, full=args.full, keep=args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+projection.py - Query projection into the SVD space without sklearn
+The SVD components are stored term-major (vocabulary x components) in float32,
+so projecting a TF-IDF query reads just the rows of its nonzero terms: a
+sparse-dense product over a memory-mapped matrix, followed by L2
+normalization. With SCOUT_PROJECTION_DENSITY < 1 only the largest loadings
+are kept, trading a little fidelity for size. The matrix is stored sparse
+(CSR) whenever that is smaller, e.g. for the many all-zero rows of unused
+hashed columns (see utils/vocabulary.py).
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+PROJECTION_DTYPE = np.float32
+
+# Share of loadings kept by magnitude (1 = dense projection)
+PROJECTION_DENSITY = float(os.environ.get("SCOUT_PROJECTION_DENSITY", "1"))
+
+# Stored layout; versions written with another one are rebuilt
+PROJECTION_LAYOUT = f"term-major-f32-density{PROJECTION_DENSITY:g}"
+
+DENSE_FILE = "matrix.npy"
+SPARSE_FILES = ("data.npy", "indices.npy", "indptr.npy", "shape.npy")
+
+
+class QueryProjection:
+    """Term-major projection: row t holds term t's loading on every component"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.n_terms, self.n_components = matrix.shape
+
+    @classmethod
+    def from_components(cls, components, density=PROJECTION_DENSITY):
+        """Projection from SVD `components_` (components x vocabulary), keeping the
+        `density` share of loadings with the largest magnitude"""
+        matrix = np.array(np.asarray(components).T, dtype=PROJECTION_DTYPE, order="C")
+        if density < 1:
+            keep = int(round(density * matrix.size))
+            if keep <= 0:
+                threshold = np.inf
+            else:
+                threshold = np.partition(np.abs(matrix).ravel(), matrix.size - keep)[matrix.size - keep]
+            matrix[np.abs(matrix) < threshold] = 0
+        # CSR costs a value and a column index per loading, plus a row pointer per term
+        nnz = np.count_nonzero(matrix)
+        if nnz * 8 + (matrix.shape[0] + 1) * 4 >= matrix.nbytes:
+            return cls(matrix)
+        return cls(csr_matrix(matrix, dtype=PROJECTION_DTYPE))
+
+    @property
+    def sparse(self):
+        return issparse(self.matrix)
+
+    def project(self, query_tfidf):
+        """L2-normalized float32 projections, one row per TF-IDF query row"""
+        # float32 query, so the product never upcasts the projection
+        query_tfidf = csr_matrix(query_tfidf, dtype=PROJECTION_DTYPE)
+        projected = query_tfidf @ self.matrix
+        if issparse(projected):
+            projected = projected.toarray()
+        projected = np.asarray(projected, dtype=PROJECTION_DTYPE)
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.where(norms > 0, norms, 1)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if not self.sparse:
+            np.save(directory / DENSE_FILE, self.matrix)
+            return
+        parts = (self.matrix.data, self.matrix.indices, self.matrix.indptr, np.array(self.matrix.shape))
+        for fname, array in zip(SPARSE_FILES, parts):
+            np.save(directory / fname, array)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        if (directory / DENSE_FILE).exists():
+            return cls(np.load(directory / DENSE_FILE, mmap_mode=mmap_mode))
+        data, indices, indptr, shape = (np.load(directory / fname, mmap_mode=mmap_mode) for fname in SPARSE_FILES)
+        return cls(csr_matrix((data, indices, indptr), shape=tuple(int(n) for n in shape), copy=False))
+
+    def stats(self):
+        stored = self.matrix.nnz if self.sparse else self.matrix.size
+        return {
+            "terms": int(self.n_terms),
+            "components": int(self.n_components),
+            "density": round(stored / max(self.n_terms * self.n_components, 1), 4),
+            "bytes": int(self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+                         if self.sparse else self.matrix.nbytes),
+        }
+
+
+def fidelity(dense, pruned, query_tfidf):
+    """Mean cosine between the projections of `query_tfidf` by two projections"""
+    a, b = dense.project(query_tfidf), pruned.project(query_tfidf)
+    return float((a * b).sum(axis=1).mean()) if len(a) else 1.0
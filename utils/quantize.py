@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+quantize.py - int8 scalar quantization of the SVD document vectors
+Each dimension is mapped affinely onto the 256 int8 levels between its
+minimum and maximum over the corpus, so a vector costs 1 byte per dimension
+instead of 4. Inner products are computed directly from the codes,
+q . x ~= codes @ (q * scale) + q . offset, in row chunks so the float32
+working copy stays small; the best candidates can then be re-scored against
+the float32 vectors (memory-mapped, so only those rows are paged in).
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from utils.topk import top_k_with_scores
+
+# Rows decoded per matrix multiply in scores()
+CHUNK_ROWS = 2048
+
+# Candidates re-scored in float32 per result (0 disables re-ranking)
+RERANK_FACTOR = int(os.environ.get("SCOUT_RERANK_FACTOR", "4"))
+
+CODES_FILE = "codes.npy"
+PARAMS_FILE = "params.npy"  # row 0: scale, row 1: offset
+REPORT_FILE = "recall.json"
+
+
+class QuantizedVectors:
+    """int8 codes with a per-dimension scale and offset"""
+
+    def __init__(self, codes, scale, offset):
+        self.codes = codes
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+
+    @classmethod
+    def build(cls, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            dims = vectors.shape[1]
+            return cls(np.zeros((0, dims), dtype=np.int8), np.ones(dims), np.zeros(dims))
+        lo = vectors.min(axis=0)
+        span = vectors.max(axis=0) - lo
+        scale = np.where(span > 0, span / 255, 1).astype(np.float32)
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start in range(0, len(vectors), CHUNK_ROWS):
+            block = vectors[start:start + CHUNK_ROWS]
+            codes[start:start + CHUNK_ROWS] = np.clip(np.rint((block - lo) / scale) - 128, -128, 127)
+        return cls(codes, scale, lo + 128 * scale)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def scores(self, queries, rows=None):
+        """Approximate inner products, shape (len(queries), len(rows)), of float32
+        `queries` with the vectors of `rows` (default: all)"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        scaled = (queries * self.scale).T
+        bias = queries @ self.offset
+        n = len(self) if rows is None else len(rows)
+        out = np.empty((n, queries.shape[0]), dtype=np.float32)
+        decoded = np.empty((min(n, CHUNK_ROWS), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n)
+            codes = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            chunk = decoded[:stop - start]
+            np.copyto(chunk, codes)
+            np.matmul(chunk, scaled, out=out[start:stop])
+        out += bias
+        return out.T
+
+    def search(self, queries, k, rows=None, vectors=None, rerank=RERANK_FACTOR):
+        """(ids, scores) of the k best of `rows` (default: all) per query.
+
+        With float32 `vectors` and rerank > 0, the best k * rerank by quantized
+        score are re-scored exactly, so returned scores are float32 inner products.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        approx = self.scores(queries, rows)
+        if vectors is None or rerank <= 0:
+            top, top_scores = top_k_with_scores(approx, k)
+            return (top if rows is None else rows[top]), top_scores
+
+        shortlist, _ = top_k_with_scores(approx, k * rerank)
+        if rows is not None:
+            shortlist = rows[shortlist]
+        candidates = np.asarray(vectors[shortlist.ravel()]).reshape(*shortlist.shape, vectors.shape[1])
+        exact = np.einsum("qkd,qd->qk", candidates, queries)
+        top, top_scores = top_k_with_scores(exact, k)
+        return np.take_along_axis(shortlist, top, axis=1), top_scores
+
+    def add(self, vectors):
+        """Quantized vectors with `vectors` appended, encoded on the existing grid"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        lo = self.offset - 128 * self.scale
+        codes = np.clip(np.rint((vectors - lo) / self.scale) - 128, -128, 127).astype(np.int8)
+        return QuantizedVectors(np.vstack([self.codes, codes]), self.scale, self.offset)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / CODES_FILE, np.ascontiguousarray(self.codes))
+        np.save(directory / PARAMS_FILE, np.vstack([self.scale, self.offset]))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        scale, offset = np.load(directory / PARAMS_FILE)
+        return cls(np.load(directory / CODES_FILE, mmap_mode=mmap_mode), scale, offset)
+
+    def stats(self):
+        return {
+            "dtype": "int8",
+            "rerank_factor": RERANK_FACTOR,
+            "bytes": int(self.codes.nbytes),
+            "float32_bytes": int(self.codes.size * 4),
+        }
+
+
+def recall_report(vectors, quantized, queries, k, rerank=RERANK_FACTOR, batch=16):
+    """recall@k of quantized search, with and without float32 re-ranking, against
+    exact float32 search over `vectors`; also the largest score error"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    k = min(k, len(vectors))
+    hits = {"recall_int8": 0, "recall_reranked": 0}
+    max_error = 0.0
+    for start in range(0, queries.shape[0], batch):
+        block = queries[start:start + batch]
+        exact = block @ vectors.T
+        exact_ids = top_k_with_scores(exact, k)[0].tolist()
+        approx = quantized.scores(block)
+        max_error = max(max_error, float(np.abs(approx - exact).max()) if exact.size else 0.0)
+        found = {"recall_int8": top_k_with_scores(approx, k)[0]}
+        if rerank > 0:
+            found["recall_reranked"] = quantized.search(block, k, vectors=vectors, rerank=rerank)[0]
+        for name, ids in found.items():
+            hits[name] += sum(len(set(a) & set(e)) for a, e in zip(ids.tolist(), exact_ids))
+
+    total = max(queries.shape[0] * k, 1)
+    report = {"k": k, "queries": int(queries.shape[0]), "recall_int8": round(hits["recall_int8"] / total, 4)}
+    if rerank > 0:
+        report["rerank_factor"] = rerank
+        report["recall_reranked"] = round(hits["recall_reranked"] / total, 4)
+    report.update({
+        "max_abs_error": round(max_error, 6),
+        "bytes_int8": int(quantized.codes.nbytes),
+        "bytes_float32": int(vectors.nbytes),
+    })
+    return report
+
+
+def save_report(directory, report):
+    (Path(directory) / REPORT_FILE).write_text(json.dumps(report, indent=2))
+
+
+def load_report(directory):
+    path = Path(directory) / REPORT_FILE
+    return json.loads(path.read_text()) if path.exists() else None
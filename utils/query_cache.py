@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+query_cache.py - Query-result cache for the search endpoints
+An in-process LRU of encoded response bodies, bounded by bytes with a TTL,
+optionally backed by a shared Redis so multiple workers share hits. Keys
+embed the corpus hash, so a new init.json invalidates every entry.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from utils.text import normalize_text
+
+ENTRY_OVERHEAD = 128  # rough per-entry bookkeeping cost, in bytes
+
+
+def make_key(endpoint, corpus_hash, query, **params):
+    """Cache key for a query on an endpoint against a specific corpus version.
+
+    The query and parameters are JSON-encoded, so no value can spell out
+    another parameter; parameters with falsy values are left out.
+    """
+    extra = sorted((k, normalize_text(str(v))) for k, v in params.items() if v)
+    payload = json.dumps([endpoint, normalize_text(query), extra], ensure_ascii=False, separators=(",", ":"))
+    return f"scout:{corpus_hash}:{payload}"
+
+
+class RedisBackend:
+    """Shared second-level cache; requires the optional `redis` package"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+
+class QueryCache:
+    """Thread-safe LRU of bytes values with a byte budget and a TTL"""
+
+    def __init__(self, max_bytes, ttl, backend=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + len(value) + ENTRY_OVERHEAD
+
+    def get(self, key):
+        """Cached value for `key`, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._evict(key)
+
+        if self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as exc:
+                print(f"[cache] backend get failed – {exc}")
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.backend_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, self.ttl)
+            except Exception as exc:
+                print(f"[cache] backend set failed – {exc}")
+        self._store(key, value)
+
+    def _store(self, key, value):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= self._size(key, value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.backend_hits) / lookups if lookups else 0.0,
+                "backend": type(self.backend).__name__ if self.backend else None,
+            }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+serialization.py - JSON encoding for API responses
+Uses orjson when it is installed (native NumPy support), otherwise the
+standard library encoder with a NumPy-aware default hook. Both produce bytes,
+so pre-rendered fragments can be spliced into responses without re-encoding.
+"""
+import json
+from types import MappingProxyType
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(obj):
+    """Encode the non-JSON types that appear in response payloads"""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    if isinstance(obj, tuple):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    ENCODER = "orjson"
+
+    def dumps(obj):
+        """Serialize `obj` to JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+else:
+    ENCODER = "json"
+    # NaN and infinities are not JSON: fail instead of sending them to clients
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+    def dumps(obj):
+        """Serialize `obj` to JSON bytes"""
+        return _encoder.encode(obj).encode("utf-8")
+
+
+def join_array(fragments):
+    """Splice already-encoded JSON values into a JSON array"""
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def join_object(**fragments):
+    """Splice already-encoded JSON values into a JSON object"""
+    return b"{" + b",".join(dumps(key) + b":" + value for key, value in fragments.items()) + b"}"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+skill_index.py - Skill posting lists and skill co-occurrence
+Built offline from the job store's skill lists: for every skill, the sorted
+ids of the jobs listing it, and a sparse skill x skill matrix counting the
+jobs that list both (its diagonal is each skill's job count). Serves /skills
+from the posting lists of the requested skills only, never scanning all jobs.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from utils.filters import Postings
+from utils.text import normalize_text
+from utils.topk import top_k_with_scores
+
+
+class SkillIndex:
+    """skill -> postings and skill co-occurrence counts over one corpus"""
+
+    def __init__(self, vocab, postings, cooccurrence):
+        self.vocab = tuple(vocab)
+        self.postings = postings
+        self.cooccurrence = cooccurrence.tocsr()
+        self.job_counts = self.cooccurrence.diagonal()
+        self._codes = {}
+        for code, skill in enumerate(self.vocab):
+            self._codes.setdefault(normalize_text(skill), []).append(code)
+
+    @classmethod
+    def build(cls, jobs):
+        """Index the skills of a JobStore; codes follow its skill vocabulary"""
+        offsets = np.asarray(jobs.skill_offsets)
+        skill_ids = np.asarray(jobs.skill_ids)
+        n_skills = len(jobs.skill_vocab)
+        rows = np.repeat(np.arange(len(jobs), dtype=np.int32), np.diff(offsets))
+
+        # Binary job x skill incidence; a skill listed twice on a job counts once
+        incidence = sp.csr_matrix(
+            (np.ones(len(skill_ids), dtype=np.int32), (rows, skill_ids)), shape=(len(jobs), n_skills)
+        )
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        # Its columns are the posting lists, with job ids in ascending order
+        by_skill = incidence.tocsc()
+        by_skill.sort_indices()
+        postings = Postings(by_skill.indptr.astype(np.int64), by_skill.indices.astype(np.int32))
+        cooccurrence = (incidence.T @ incidence).tocsr()
+        return cls(jobs.skill_vocab, postings, cooccurrence)
+
+    def save(self, path):
+        matrix = self.cooccurrence
+        np.savez(
+            path,
+            vocab=np.array(self.vocab, dtype=str),
+            offsets=self.postings.offsets,
+            job_ids=self.postings.job_ids,
+            co_indptr=matrix.indptr,
+            co_indices=matrix.indices,
+            co_data=matrix.data,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            vocab = arrays["vocab"].tolist()
+            matrix = sp.csr_matrix(
+                (arrays["co_data"], arrays["co_indices"], arrays["co_indptr"]), shape=(len(vocab), len(vocab))
+            )
+            return cls(vocab, Postings(arrays["offsets"], arrays["job_ids"]), matrix)
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def resolve(self, skills):
+        """(codes, names of unknown skills) for requested skill names, case-insensitively"""
+        codes, unknown = [], []
+        for skill in skills:
+            matches = self._codes.get(normalize_text(skill))
+            if matches:
+                codes.extend(matches)
+            else:
+                unknown.append(skill)
+        return sorted(set(codes)), unknown
+
+    def jobs_for(self, codes, k=20):
+        """[(job_id, overlap)] of the k jobs listing the most of the given skills.
+
+        Only the skills' posting lists are read: jobs listing every skill (the
+        posting-list intersection) come first, then partial matches; ties go to
+        the lower job id.
+        """
+        if not codes:
+            return []
+        job_ids, overlap = np.unique(
+            np.concatenate([self.postings.jobs(code) for code in codes]), return_counts=True
+        )
+        # One int64 key per job: overlap in the high bits, then the lower id first
+        best, _ = top_k_with_scores(overlap.astype(np.int64) << 32 | (0x7FFFFFFF - job_ids.astype(np.int64)), k)
+        return [(int(job_ids[i]), int(overlap[i])) for i in best]
+
+    def related(self, codes, k=10):
+        """[(skill, co-occurrences, jobs listing it)] for the k skills co-occurring
+        most often with the given ones, excluding them.
+
+        Co-occurrences are summed over the given skills, read from their rows of
+        the co-occurrence matrix.
+        """
+        if not codes:
+            return []
+        counts = np.asarray(self.cooccurrence[codes].sum(axis=0)).ravel()
+        counts[codes] = 0
+        candidates = np.flatnonzero(counts)
+        best, best_counts = top_k_with_scores(counts[candidates], k)
+        return [
+            (self.vocab[candidates[i]], int(c), int(self.job_counts[candidates[i]]))
+            for i, c in zip(best, best_counts)
+        ]
+
+    def stats(self):
+        return {
+            "skills": len(self),
+            "postings": int(len(self.postings.job_ids)),
+            "cooccurring_pairs": int(self.cooccurrence.nnz),
+        }
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+text.py - Text normalization shared by lookups, filters, the keyword index
+and the query cache
+"""
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of `text`: lowercased, with runs of
+    whitespace collapsed to single spaces and the ends stripped"""
+    return " ".join((text or "").lower().split())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+timing.py - Per-phase wall-clock timing for startup and builds
+Phases are logged as one line, e.g.
+[startup] jobs 0.041s | artifacts 0.009s | keyword_index 0.002s | total 0.060s
+"""
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Records how long each named phase of a larger step takes"""
+
+    def __init__(self, label):
+        self.label = label
+        self.phases = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self):
+        return time.perf_counter() - self._start
+
+    def report(self):
+        """Print the breakdown and return it as {phase: seconds, "total": seconds}"""
+        timings = {**self.phases, "total": self.total()}
+        print(f"[{self.label}] " + " | ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+        return {name: round(seconds, 6) for name, seconds in timings.items()}
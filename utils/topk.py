@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+topk.py - Partial top-K selection shared by every ranking path
+argpartition (O(N)) to find the K best, then a sort of just those K.
+"""
+import numpy as np
+
+
+def top_k_with_scores(scores, k):
+    """Return (indices, scores) of the k largest entries, best first.
+
+    A 1-D `scores` gives arrays of shape (k,); a 2-D `scores` is treated as a
+    batch of queries (one per row) and gives arrays of shape (rows, k).
+    """
+    scores = np.asarray(scores)
+    single = scores.ndim == 1
+    scores = np.atleast_2d(scores)
+    k = max(0, min(int(k), scores.shape[1]))
+
+    if k == 0:
+        idx = np.empty((scores.shape[0], 0), dtype=np.int64)
+    elif k == scores.shape[1]:
+        idx = np.argsort(-scores, axis=1, kind="stable")
+    else:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+        idx = np.take_along_axis(idx, order, axis=1)
+
+    vals = np.take_along_axis(scores, idx, axis=1)
+    if single:
+        return idx[0], vals[0]
+    return idx, vals
+
+
+def top_k(scores, k):
+    """Indices of the k largest entries, best first (row-wise for 2-D input)"""
+    return top_k_with_scores(scores, k)[0]
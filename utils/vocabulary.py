@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+vocabulary.py - TF-IDF vocabulary strategies
+"full":   every unigram and bigram seen (min_df=1); the vocabulary, and with it
+          the SVD components and query projection, grows with the corpus.
+"pruned": terms in fewer than SCOUT_VOCAB_MIN_DF jobs are dropped, and the
+          vocabulary is optionally capped at SCOUT_VOCAB_MAX_FEATURES terms.
+"hashed": stateless; terms are hashed into SCOUT_HASH_FEATURES columns, so no
+          vocabulary is stored at all, only the fitted per-column IDF array.
+All three share the analyzer (English stop words, unigrams and bigrams) and
+drop terms found in more than MAX_DF of the jobs.
+"""
+import os
+
+import numpy as np
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+STRATEGIES = ("full", "pruned", "hashed")
+
+VOCABULARY = os.environ.get("SCOUT_VOCABULARY", "full")
+VOCAB_MIN_DF = int(os.environ.get("SCOUT_VOCAB_MIN_DF", "2"))
+VOCAB_MAX_FEATURES = int(os.environ.get("SCOUT_VOCAB_MAX_FEATURES", "0")) or None
+HASH_FEATURES = int(os.environ.get("SCOUT_HASH_FEATURES", str(1 << 18)))
+
+# Analyzer shared by every strategy
+ANALYZER = {"stop_words": "english", "ngram_range": (1, 2)}
+MAX_DF = 0.7
+
+
+class HashedTfidfVectorizer:
+    """TF-IDF over hashed term columns: the only fitted state is the IDF array.
+
+    Smoothed IDF and L2-normalized rows, as TfidfVectorizer. Columns no fitted
+    job hashed into, or more than `max_df` of them, get an IDF of 0, so their
+    terms drop out of every vector, like out-of-vocabulary terms do.
+    """
+
+    def __init__(self, n_features=HASH_FEATURES, max_df=MAX_DF, **analyzer):
+        self.hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None, **analyzer)
+        self.max_df = max_df
+        self.idf_ = None
+
+    @property
+    def n_features(self):
+        return self.hasher.n_features
+
+    def build_analyzer(self):
+        return self.hasher.build_analyzer()
+
+    def fit_transform(self, texts):
+        counts = self.hasher.transform(texts)
+        n_jobs = counts.shape[0]
+        df = np.bincount(counts.indices, minlength=self.n_features)
+        idf = np.log((1 + n_jobs) / (1 + df)) + 1
+        idf[(df == 0) | (df > self.max_df * n_jobs)] = 0
+        self.idf_ = idf.astype(np.float32)
+        return self._weight(counts)
+
+    def transform(self, texts):
+        return self._weight(self.hasher.transform(texts))
+
+    def _weight(self, counts):
+        counts.data *= self.idf_[counts.indices]
+        counts.eliminate_zeros()
+        return normalize(counts, norm="l2", axis=1)
+
+    @property
+    def vocabulary_(self):
+        """Membership test standing in for TfidfVectorizer's term -> column map:
+        a term is known if its column was fitted (see ingest.oov_rate)"""
+        return _HashedVocabulary(self)
+
+
+class _HashedVocabulary:
+    def __init__(self, vectorizer):
+        self.idf = vectorizer.idf_
+        self.hasher = FeatureHasher(vectorizer.n_features, input_type="string", alternate_sign=False)
+
+    def __contains__(self, term):
+        return bool(self.idf[self.hasher.transform([[term]]).indices[0]] > 0)
+
+
+def make_vectorizer(strategy=VOCABULARY, min_df=VOCAB_MIN_DF, max_features=VOCAB_MAX_FEATURES,
+                    n_features=HASH_FEATURES):
+    """Unfitted vectorizer for a vocabulary strategy"""
+    if strategy == "full":
+        return TfidfVectorizer(max_df=MAX_DF, min_df=1, **ANALYZER)
+    if strategy == "pruned":
+        return TfidfVectorizer(max_df=MAX_DF, min_df=min_df, max_features=max_features, **ANALYZER)
+    if strategy == "hashed":
+        return HashedTfidfVectorizer(n_features=n_features, max_df=MAX_DF, **ANALYZER)
+    raise ValueError(f"Unknown vocabulary strategy: {strategy!r} (expected one of {STRATEGIES})")
+
+
+def vocabulary_layout(strategy=VOCABULARY, min_df=VOCAB_MIN_DF, max_features=VOCAB_MAX_FEATURES,
+                      n_features=HASH_FEATURES):
+    """Manifest label of a strategy and its settings; versions built with another
+    one are refit"""
+    if strategy == "pruned":
+        return f"pruned-min_df{min_df}-max{max_features or 'all'}"
+    if strategy == "hashed":
+        return f"hashed-{n_features}"
+    return strategy
+
+
+def vocabulary_stats(vectorizer):
+    if isinstance(vectorizer, HashedTfidfVectorizer):
+        return {"kind": "hashed", "features": int(vectorizer.n_features),
+                "fitted_columns": int(np.count_nonzero(vectorizer.idf_))}
+    return {"kind": "terms", "features": len(vectorizer.vocabulary_)}